@@ -6,4 +6,4 @@ uv run python -m pyserini.index.lucene \
   --index /mnt/disk6/daiki/Datasets/iKAT/ikat_demo/index/ \
   --generator DefaultLuceneDocumentGenerator \
   --threads 8 \
-  --storePositions --storeDocvectors --storeRaw
\ No newline at end of file
+  --storePositions --storeDocvectors --storeContents --storeRaw
\ No newline at end of file
@@ -12,8 +12,10 @@ def main(query):
 
     # 最もスコアが高いドキュメントの内容を表示
     best_ranked_doc = searcher.doc(hits[0].docid)
-    parsed_doc = json.loads(best_ranked_doc.raw())
-    print(parsed_doc['contents'])
+    contents = best_ranked_doc.contents()   # --storeContents で保存されたフィールド
+    if contents is None:
+        contents = json.loads(best_ranked_doc.raw())['contents']
+    print(contents)
 
 
 if __name__ == "__main__":
@@ -1,48 +1,53 @@
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
+from typing import List
 from sentence_transformers import CrossEncoder
 import json
+import heapq
+from operator import itemgetter
+
+
+def rewrite_queries(contexts: List[str], model, tokenizer, device, batch_size: int = 8) -> List[str]:
+    rewrites = []
+    for start in range(0, len(contexts), batch_size):
+        # Tokenize and generate a whole batch of contexts at once
+        batch = tokenizer(contexts[start:start + batch_size], return_tensors="pt", padding=True).to(device)
+        with torch.inference_mode(), torch.autocast(device_type=device, dtype=torch.float16, enabled=(device == "cuda")):
+            output_ids = model.generate(
+                **batch,
+                max_length=200,
+                num_beams=4,
+                repetition_penalty=2.5,
+                length_penalty=1.0,
+                early_stopping=True
+            )
+        rewrites.extend(tokenizer.batch_decode(output_ids, skip_special_tokens=True))
+    return rewrites
 
 
 def rewrite_query(context: str, model, tokenizer, device) -> str:
-    tokenized_context = tokenizer.encode(context, return_tensors="pt").to(device)
-    output_ids = model.generate(
-        tokenized_context,
-        max_length=200,
-        num_beams=4,
-        repetition_penalty=2.5,
-        length_penalty=1.0,
-        early_stopping=True
-    ).to(device)
-
-    rewrite = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-    return rewrite
+    return rewrite_queries([context], model, tokenizer, device)[0]
 
 
 def get_ptkb_statements(query, num_ptkb, ptkb, reranker):
-    # Find the similarity of PTKB statements with the given query
-    similarity_scores = [reranker.predict([[query, ptkb_statement]])[0] for ptkb_statement in ptkb.values()]
-
-    # Pair each statement with its similarity score
-    statement_score_pairs = list(zip(list(ptkb.values()), similarity_scores))
+    statements = list(ptkb.values())
+    if not statements:
+        return ''
 
-    # Sort the pairs based on the similarity scores in descending order
-    sorted_pairs = sorted(statement_score_pairs, key=lambda x: x[1], reverse=True)
+    # Find the similarity of PTKB statements with the given query in a single batch
+    pairs = [[query, ptkb_statement] for ptkb_statement in statements]
+    similarity_scores = reranker.predict(pairs, batch_size=min(32, len(pairs)))
 
-    # Extract the sorted responses
-    sorted_ptkb_statements = [pair[0] for pair in sorted_pairs]
+    # Select the required number of statements with the highest similarity scores
+    top_pairs = heapq.nlargest(num_ptkb, zip(statements, similarity_scores), key=itemgetter(1))
 
     # Return required number of PTKB statements
-    return ' '.join(sorted_ptkb_statements[:num_ptkb])
+    return ' '.join(statement for statement, _ in top_pairs)
 
 
-def extract_context_with_ptkb_statements(json_data, number, turn_id, ptkb_statements):
+def extract_context_with_ptkb_statements(topic_index, number, turn_id, ptkb_statements):
     # Find the correct dictionary with the given number
-    data = None
-    for item in json_data:
-        if item['number'] == number:
-            data = item
-            break
+    data = topic_index.get(number)
 
     # If we couldn't find the data for the given number
     if not data:
@@ -69,18 +74,28 @@ def extract_context_with_ptkb_statements(json_data, number, turn_id, ptkb_statem
 def main(query, num_ptkb, ptkb):
     with open('/mnt/disk6/daiki/Datasets/iKAT/ikat_demo/test.json', 'r') as f:
         topics = json.load(f)
+    topic_index = {topic['number']: topic for topic in topics}
     
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    rewriter = AutoModelForSeq2SeqLM.from_pretrained("castorini/t5-base-canard").to(device).eval()
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    rewriter = AutoModelForSeq2SeqLM.from_pretrained("castorini/t5-base-canard", torch_dtype=dtype).to(device).eval()
+    if device == "cuda":
+        # generate() calls forward once per decoding step, so compile forward to cut kernel launch overhead
+        rewriter.forward = torch.compile(rewriter.forward, mode="reduce-overhead", fullgraph=False)
     rewriter_tokenizer = AutoTokenizer.from_pretrained("castorini/t5-base-canard")
 
-    reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+    if device == "cuda":
+        reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+    else:
+        # On CPU, run the int8 dynamically quantized ONNX export through ONNX Runtime
+        reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', backend='onnx',
+                                model_kwargs={'file_name': 'onnx/model_qint8_avx512_vnni.onnx'})
     ptkb_statements = get_ptkb_statements(query, num_ptkb, ptkb, reranker)
     print(ptkb_statements)
 
     number_to_search = "10-1"
     turn_id_to_search = 6
-    utterance, context = extract_context_with_ptkb_statements(topics, number_to_search, turn_id_to_search, ptkb_statements)
+    utterance, context = extract_context_with_ptkb_statements(topic_index, number_to_search, turn_id_to_search, ptkb_statements)
     print(f"Raw Utterance: {utterance}")
     print(f"Turn Context: {context}")
 
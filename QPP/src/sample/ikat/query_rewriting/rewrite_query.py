@@ -1,16 +1,13 @@
 # Load model and tokenizer from HuggingFace
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
+from typing import List
 import json
 
 
-def extract_context(json_data, number, turn_id):
+def extract_context(topic_index, number, turn_id):
     # Find the correct dictionary with the given number
-    data = None
-    for item in json_data:
-        if item['number'] == number:
-            data = item
-            break
+    data = topic_index.get(number)
 
     # If we couldn't find the data for the given number
     if not data:
@@ -33,32 +30,44 @@ def extract_context(json_data, number, turn_id):
 
     return current_utterance, context
 
-def rewrite_query(context: str, model, tokenizer, device) -> str:
-  tokenized_context = tokenizer.encode(context, return_tensors="pt").to(device)
-  output_ids = model.generate(
-      tokenized_context,
-      max_length=200,
-      num_beams=4,
-      repetition_penalty=2.5,
-      length_penalty=1.0,
-      early_stopping=True
-  ).to(device)
+def rewrite_queries(contexts: List[str], model, tokenizer, device, batch_size: int = 8) -> List[str]:
+  rewrites = []
+  for start in range(0, len(contexts), batch_size):
+    # Tokenize and generate a whole batch of contexts at once
+    batch = tokenizer(contexts[start:start + batch_size], return_tensors="pt", padding=True).to(device)
+    with torch.inference_mode(), torch.autocast(device_type=device, dtype=torch.float16, enabled=(device == "cuda")):
+      output_ids = model.generate(
+        **batch,
+        max_length=200,
+        num_beams=4,
+        repetition_penalty=2.5,
+        length_penalty=1.0,
+        early_stopping=True
+      )
+    rewrites.extend(tokenizer.batch_decode(output_ids, skip_special_tokens=True))
+  return rewrites
+
 
-  rewrite = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-  return rewrite
+def rewrite_query(context: str, model, tokenizer, device) -> str:
+  return rewrite_queries([context], model, tokenizer, device)[0]
 
 
 def main():
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    rewriter = AutoModelForSeq2SeqLM.from_pretrained("castorini/t5-base-canard").to(device).eval()
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    rewriter = AutoModelForSeq2SeqLM.from_pretrained("castorini/t5-base-canard", torch_dtype=dtype).to(device).eval()
+    if device == "cuda":
+        # generate() calls forward once per decoding step, so compile forward to cut kernel launch overhead
+        rewriter.forward = torch.compile(rewriter.forward, mode="reduce-overhead", fullgraph=False)
     rewriter_tokenizer = AutoTokenizer.from_pretrained("castorini/t5-base-canard")
 
     with open('/mnt/disk6/daiki/Datasets/iKAT/ikat_demo/test.json', 'r') as f:
         topics = json.load(f)
+    topic_index = {topic['number']: topic for topic in topics}
 
     number_to_search = "10-1"
     turn_id_to_search = 6
-    utterance, context = extract_context(topics, number_to_search, turn_id_to_search)
+    utterance, context = extract_context(topic_index, number_to_search, turn_id_to_search)
     print(f"Raw Utterance: {utterance}")
     print(f"Turn Context: {context}")
 
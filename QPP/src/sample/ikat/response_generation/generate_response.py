@@ -1,37 +1,102 @@
 import torch
+import numpy as np
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 import json
+import heapq
 from sentence_transformers import CrossEncoder
 from pyserini.search.lucene import LuceneSearcher
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-def rerank_passages(query, passages, reranker):
-    res = []
-    query_passage_pairs = [[query, passage['passage_text']] for passage in passages]
-    scores = reranker.predict(query_passage_pairs)
 
-    for passage, score in zip(passages, scores):
-        passage['reranker_score'] = score
-        res.append(passage)
+@lru_cache(maxsize=1)
+def _get_searcher(index_path):
+    # Reuse the opened index across queries
+    return LuceneSearcher(index_path)
 
-    ranked_passages = sorted(passages, key=lambda x: x['reranker_score'], reverse=True)
-    return ranked_passages
+
+@lru_cache(maxsize=4)
+def _get_reranker(model_name):
+    # Reuse the loaded CrossEncoder (and its tokenizer) across queries
+    if torch.cuda.is_available():
+        return CrossEncoder(model_name, device='cuda', model_kwargs={'torch_dtype': torch.float16})
+    # On CPU, run the int8 dynamically quantized ONNX export through ONNX Runtime
+    return CrossEncoder(model_name, backend='onnx', model_kwargs={'file_name': 'onnx/model_qint8_avx512_vnni.onnx'})
+
+
+# Token ids of passages already seen by the reranker, keyed by (tokenizer, passage_id)
+_PASSAGE_TOKEN_CACHE_SIZE = 100000
+_passage_token_cache = OrderedDict()
+
+
+def _get_passage_token_ids(tokenizer, passage):
+    key = (tokenizer.name_or_path, passage['passage_id'])
+    token_ids = _passage_token_cache.get(key)
+    if token_ids is None:
+        token_ids = tokenizer.encode(passage['passage_text'], add_special_tokens=False)
+        _passage_token_cache[key] = token_ids
+        if len(_passage_token_cache) > _PASSAGE_TOKEN_CACHE_SIZE:
+            _passage_token_cache.popitem(last=False)
+    else:
+        _passage_token_cache.move_to_end(key)
+    return token_ids
+
+
+def _predict_with_cached_passages(query, passages, reranker, batch_size=128):
+    # Tokenize only the query and splice it with the cached passage token ids
+    tokenizer = reranker.tokenizer
+    query_ids = tokenizer.encode(query, add_special_tokens=False)
+    features = [
+        tokenizer.prepare_for_model(query_ids, _get_passage_token_ids(tokenizer, passage),
+                                    truncation=True, max_length=reranker.max_length)
+        for passage in passages
+    ]
+
+    scores = []
+    for start in range(0, len(features), batch_size):
+        batch = tokenizer.pad(features[start:start + batch_size], return_tensors='pt').to(reranker.device)
+        with torch.inference_mode():
+            logits = reranker.activation_fn(reranker.model(**batch).logits)
+        scores.append(logits[:, 0].float().cpu().numpy())
+    return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+def rerank_passages(query, passages, reranker, top_k=None):
+    scores = _predict_with_cached_passages(query, passages, reranker)
+
+    # Only partially sort when the caller needs just the top-k passages
+    if top_k is not None:
+        order = heapq.nlargest(top_k, range(len(passages)), key=scores.__getitem__)
+    else:
+        order = np.argsort(-scores, kind='stable')
+
+    # Return new dicts instead of mutating the candidate passages in place
+    return [{**passages[i], 'reranker_score': float(scores[i])} for i in order]
+
+
+def _get_passage_text(doc):
+    # Prefer the stored contents field (index built with --storeContents) over parsing the raw JSON
+    contents = doc.contents()
+    if contents is not None:
+        return contents
+    return json.loads(doc.raw())['contents']
 
 
 def retrieve_using_bm25(query):
     index_path = '/mnt/disk6/daiki/Datasets/iKAT/ikat_demo/index'
-    searcher = LuceneSearcher(index_path)
+    searcher = _get_searcher(index_path)
     hits = searcher.search(query)
     candidate_set = []
     for i in range(len(hits)):
         print('Rank: {} | PassageID: {} | Score: {}'.format(i+1, hits[i].docid, hits[i].score))
-        doc = searcher.doc(hits[i].docid)
-        parsed_doc = json.loads(doc.raw())
-        print(parsed_doc['contents'])
+        passage_text = _get_passage_text(searcher.doc(hits[i].docid))
+        print(passage_text)
         candidate_set.append({
             'passage_id': hits[i].docid,
             'bm25_rank': i+1,
             'bm25_score': hits[i].score,
-            'passage_text': parsed_doc['contents']
+            'passage_text': passage_text
         })
         print('=================================')
     return candidate_set
@@ -39,7 +104,7 @@ def retrieve_using_bm25(query):
 
 def generate_response(passages, model, tokenizer):
     text = ' '.join(passages)
-    inputs = tokenizer.encode("summarize: " + text, return_tensors="pt", max_length=512, truncation=True)
+    inputs = tokenizer.encode("summarize: " + text, return_tensors="pt", max_length=512, truncation=True).to(model.device)
     with torch.no_grad():
         summary_ids = model.generate(
             inputs,
@@ -52,16 +117,31 @@ def generate_response(passages, model, tokenizer):
     summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
     return summary
 
+def _load_summarizer(model_name):
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    if torch.cuda.is_available():
+        model = model.to('cuda').eval()
+        # generate() calls forward once per decoding step, so compile forward to cut kernel launch overhead
+        model.forward = torch.compile(model.forward, mode='reduce-overhead', fullgraph=False)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return model, tokenizer
+
+
 def main(query):
-    summarizer = AutoModelForSeq2SeqLM.from_pretrained('mrm8488/t5-base-finetuned-summarize-news')
-    summarizer_tokenizer = AutoTokenizer.from_pretrained('mrm8488/t5-base-finetuned-summarize-news')
-    
-    # We use the top-3 reranked passages to generate a response
-    candidate_set = retrieve_using_bm25(query)
-    reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-    reranked_passages = rerank_passages(query, candidate_set, reranker)
-    passages = [passage['passage_text'] for passage in reranked_passages][:3]
-    print(json.dumps(passages, indent=4))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Load the models in the background while BM25 runs
+        summarizer_future = executor.submit(_load_summarizer, 'mrm8488/t5-base-finetuned-summarize-news')
+        reranker_future = executor.submit(_get_reranker, 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+        # Keep the Lucene search on the main thread, which pyserini already attached to the JVM
+        candidate_set = retrieve_using_bm25(query)
+
+        # We use the top-3 reranked passages to generate a response
+        reranker = reranker_future.result()
+        reranked_passages = rerank_passages(query, candidate_set, reranker, top_k=3)
+        passages = [passage['passage_text'] for passage in reranked_passages]
+        print(json.dumps(passages, indent=4))
+
+        summarizer, summarizer_tokenizer = summarizer_future.result()
 
     generate_response(passages, summarizer, summarizer_tokenizer)
 
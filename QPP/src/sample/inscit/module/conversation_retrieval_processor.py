@@ -1,26 +1,37 @@
-import json
 import os
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional, Tuple
 import numpy as np
+import orjson
 
 from .lucene_retriever import LuceneRetriever
 from .retrieval_evaluator import RetrievalEvaluator
 
 
+# クエリ前処理で除去する質問詞
+_QUESTION_WORDS = frozenset({
+    'what', 'when', 'where', 'who', 'why', 'how', 'which', 'can', 'could', 'would',
+    'will', 'do', 'does', 'did', 'is', 'are', 'was', 'were'
+})
+# 単語の前後から除去する句読点
+_PUNCTUATION = '.,!?;:'
+
+
 class ConversationRetrievalProcessor:
     """
     会話データに対して検索を適用し、評価指標を計算するクラス
     """
     
-    def __init__(self, retriever: LuceneRetriever):
+    def __init__(self, retriever: LuceneRetriever, search_threads: Optional[int] = None):
         """
         会話検索プロセッサーを初期化
         
         Args:
             retriever: 検索エンジンのインスタンス
+            search_threads: まとめて検索する際のスレッド数（Noneの場合はCPUコア数）
         """
         self.retriever = retriever
+        self.search_threads = search_threads or os.cpu_count() or 1
         self.evaluator = RetrievalEvaluator()
     
     def _create_new_turn_structure(self, turn: Dict[str, Any], search_results: List[Dict[str, Any]], 
@@ -64,15 +75,16 @@ class ConversationRetrievalProcessor:
             search_results: 検索結果
             k_values: 評価するk値のリスト
         """
+        # 検索結果に依存する値はlabel間で共通のため一度だけ計算
+        ctx = self.evaluator.prepare_for_results(search_results, k_values)
+        
         for label in labels:
             if 'evidence' not in label:
                 continue
                 
             gold_evidence = label['evidence']
             # 全ての評価指標を一度に計算
-            metrics = self.evaluator.calculate_all_metrics(
-                search_results, gold_evidence, k_values
-            )
+            metrics = self.evaluator.calculate_all_metrics_with_ctx(ctx, gold_evidence)
             
             # 各評価指標をlabelに追加
             for metric_name, score in metrics.items():
@@ -115,23 +127,17 @@ class ConversationRetrievalProcessor:
         # 基本的な前処理
         processed_query = query.strip()
         
-        # 質問詞を除去してキーワードを抽出
-        question_words = ['what', 'when', 'where', 'who', 'why', 'how', 'which', 'can', 'could', 'would', 'will', 'do', 'does', 'did', 'is', 'are', 'was', 'were']
-        
         # 文を単語に分割
         words = processed_query.lower().split()
         
         # 質問詞と一般的な単語を除去
         filtered_words = []
         for word in words:
-            # 質問詞を除去
-            if word in question_words:
-                continue
-            # 短すぎる単語を除去（2文字以下）
-            if len(word) <= 2:
+            # 質問詞と短すぎる単語（2文字以下）を除去
+            if len(word) <= 2 or word in _QUESTION_WORDS:
                 continue
             # 句読点を除去
-            word = word.strip('.,!?;:')
+            word = word.strip(_PUNCTUATION)
             if word:
                 filtered_words.append(word)
         
@@ -144,13 +150,14 @@ class ConversationRetrievalProcessor:
         
         return keyword_query
     
-    def _process_single_turn(self, turn: Dict[str, Any], query_key: str, 
-                           k_values: List[int], calculate_ndcg: bool) -> Dict[str, Any]:
+    def _build_processed_turn(self, turn: Dict[str, Any], search_results: List[Dict[str, Any]], 
+                              query_key: str, k_values: List[int], calculate_ndcg: bool) -> Dict[str, Any]:
         """
-        単一のturnを処理
+        検索結果から処理済みのturnを作成
         
         Args:
-            turn: 処理するturn
+            turn: 元のturn
+            search_results: 検索結果
             query_key: クエリキー名
             k_values: 評価するk値のリスト
             calculate_ndcg: nDCGを計算するかどうか
@@ -158,16 +165,6 @@ class ConversationRetrievalProcessor:
         Returns:
             処理済みのturn
         """
-        if query_key not in turn:
-            return turn
-        
-        # 検索を実行
-        query = turn.get(query_key, '')
-        processed_query = self._preprocess_query(query)
-        
-        # 検索結果を取得
-        search_results = self.retriever.search(processed_query, top_k=10)
-        
         # 新しいturnの構造を作成
         new_turn = self._create_new_turn_structure(turn, search_results, query_key)
         
@@ -177,37 +174,87 @@ class ConversationRetrievalProcessor:
         
         return new_turn
     
-    def _process_turns(self, target_data: Dict[str, Any], k_values: List[int], 
-                      calculate_ndcg: bool) -> None:
+    def _process_dialogues(self, dialogues: Iterable[Dict[str, Any]], k_values: List[int], 
+                           calculate_ndcg: bool) -> None:
         """
-        turnsリストを処理
+        複数ダイアログのturnsのクエリを1回のbatch_searchで検索して処理
         
         Args:
-            target_data: 対象データ
+            dialogues: 処理するダイアログのイテラブル
             k_values: 評価するk値のリスト
             calculate_ndcg: nDCGを計算するかどうか
         """
-        if 'turns' not in target_data:
-            return
-        
         # resolvedQueryキーを使用
         query_key = 'resolvedQuery'
         
-        for i, turn in enumerate(target_data['turns']):
-            processed_turn = self._process_single_turn(turn, query_key, k_values, calculate_ndcg)
-            target_data['turns'][i] = processed_turn
+        # 検索対象のturnとクエリを先に集める
+        jobs = []
+        for target_data in dialogues:
+            if 'turns' not in target_data:
+                continue
+            
+            turns = target_data['turns']
+            for i, turn in enumerate(turns):
+                if query_key not in turn:
+                    continue
+                processed_query = self._preprocess_query(turn.get(query_key, ''))
+                jobs.append((turns, i, processed_query))
+        
+        # 空でなく重複のないクエリのみを一度に検索
+        unique_queries = list(dict.fromkeys(processed_query for _, _, processed_query in jobs if processed_query))
+        results_by_query = dict(zip(
+            unique_queries,
+            self.retriever.batch_search(unique_queries, top_k=10, threads=self.search_threads)
+        ))
+        
+        # 検索結果を各turnに戻す
+        for turns, i, processed_query in jobs:
+            search_results = results_by_query.get(processed_query, [])
+            turns[i] = self._build_processed_turn(turns[i], search_results, query_key, k_values, calculate_ndcg)
     
-    def process_json_file(self, input_file_path: str, output_dir_path: Optional[str] = None, 
-                         calculate_ndcg: bool = True, k_values: List[int] = [1, 3, 5]) -> str:
+    def load_json_file(self, input_file_path: str) -> Dict[str, Any]:
         """
-        JSONファイルを処理して検索結果を追加
+        入力JSONファイルを読み込む
         
         Args:
             input_file_path: 入力JSONファイルのパス
-            output_dir_path: 出力ディレクトリのパス（Noneの場合は入力ファイルと同じディレクトリ）
+            
+        Returns:
+            読み込んだデータ
+        """
+        with open(input_file_path, 'rb') as f:
+            return orjson.loads(f.read())
+    
+    def process_data(self, data: Dict[str, Any], calculate_ndcg: bool = True, 
+                     k_values: List[int] = [1, 3, 5]) -> Dict[str, Any]:
+        """
+        読み込み済みのデータに検索結果を追加（dataは直接更新される）
+        
+        Args:
+            data: load_json_fileなどで読み込んだデータ
             calculate_ndcg: nDCGを計算するかどうか
             k_values: nDCG計算時のk値のリスト
             
+        Returns:
+            処理済みのデータ（dataと同じオブジェクト）
+        """
+        # 全要素を処理
+        if not isinstance(data, dict):
+            raise ValueError("JSONファイルの構造が不正です")
+        
+        self._process_dialogues(data.values(), k_values, calculate_ndcg)
+        return data
+    
+    def save_json_file(self, data: Dict[str, Any], input_file_path: str, 
+                       output_dir_path: Optional[str] = None) -> str:
+        """
+        処理済みのデータを保存
+        
+        Args:
+            data: 処理済みのデータ
+            input_file_path: 入力JSONファイルのパス（出力ファイル名の生成に使用）
+            output_dir_path: 出力ディレクトリのパス（Noneの場合は入力ファイルと同じディレクトリ）
+            
         Returns:
             出力ファイルのパス
         """
@@ -218,28 +265,50 @@ class ConversationRetrievalProcessor:
         # 出力ディレクトリが存在しない場合は作成
         os.makedirs(output_dir_path, exist_ok=True)
         
-        # JSONファイルを読み込み
-        with open(input_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 全要素を処理
-        if not isinstance(data, dict):
-            raise ValueError("JSONファイルの構造が不正です")
-        
-        for top_key, target_data in data.items():
-            self._process_turns(target_data, k_values, calculate_ndcg)
-        
         # 出力ファイル名を生成
         input_filename = Path(input_file_path).stem
         output_filename = f"{input_filename}_retrieved.json"
         output_file_path = os.path.join(output_dir_path, output_filename)
         
         # 処理結果を保存
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 評価指標はnumpyのスカラーを含むためOPT_SERIALIZE_NUMPYを指定
+        with open(output_file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY, default=float))
         
         return output_file_path
     
+    def process_json_file(self, input_file_path: str, output_dir_path: Optional[str] = None, 
+                         calculate_ndcg: bool = True, k_values: List[int] = [1, 3, 5]) -> str:
+        """
+        JSONファイルを処理して検索結果を追加
+        
+        Args:
+            input_file_path: 入力JSONファイルのパス
+            output_dir_path: 出力ディレクトリのパス（Noneの場合は入力ファイルと同じディレクトリ）
+            calculate_ndcg: nDCGを計算するかどうか
+            k_values: nDCG計算時のk値のリスト
+            
+        Returns:
+            出力ファイルのパス
+        """
+        data = self.load_json_file(input_file_path)
+        self.process_data(data, calculate_ndcg, k_values)
+        return self.save_json_file(data, input_file_path, output_dir_path)
+    
+    def _metric_names(self, k_values: List[int]) -> List[str]:
+        """
+        収集対象の評価指標名を生成
+        
+        Args:
+            k_values: 評価するk値のリスト
+            
+        Returns:
+            評価指標名のリスト（例: 'ndcg@1'）
+        """
+        # 評価指標の種類を定義
+        metric_types = ['ndcg', 'precision', 'recall']
+        return [f'{metric_type}@{k}' for metric_type in metric_types for k in k_values]
+    
     def _collect_metrics_scores(self, json_data: Dict[str, Any], k_values: List[int]) -> Dict[str, List[float]]:
         """
         JSONデータから評価指標のスコアを収集
@@ -251,13 +320,7 @@ class ConversationRetrievalProcessor:
         Returns:
             各評価指標でのスコアのリスト
         """
-        # 評価指標の種類を定義
-        metric_types = ['ndcg', 'precision', 'recall']
-        metrics_by_type = {}
-        
-        for metric_type in metric_types:
-            for k in k_values:
-                metrics_by_type[f'{metric_type}@{k}'] = []
+        metrics_by_type = {metric_name: [] for metric_name in self._metric_names(k_values)}
         
         for top_key, target_data in json_data.items():
             if 'turns' not in target_data:
@@ -267,10 +330,12 @@ class ConversationRetrievalProcessor:
                 if 'labels' not in turn:
                     continue
                     
+                # 各labelの要素を一度だけ走査して対象の評価指標を収集
                 for label in turn['labels']:
-                    for metric_name in metrics_by_type.keys():
-                        if metric_name in label:
-                            metrics_by_type[metric_name].append(label[metric_name])
+                    for key, value in label.items():
+                        scores = metrics_by_type.get(key)
+                        if scores is not None:
+                            scores.append(value)
         
         return metrics_by_type
     
@@ -296,10 +361,10 @@ class ConversationRetrievalProcessor:
                     continue
                     
                 for label in turn['labels']:
-                    for k in k_values:
-                        k_key = f'ndcg@{k}'
-                        if k_key in label:
-                            ndcg_scores_by_k[k_key].append(label[k_key])
+                    for key, value in label.items():
+                        scores = ndcg_scores_by_k.get(key)
+                        if scores is not None:
+                            scores.append(value)
         
         return ndcg_scores_by_k
     
@@ -314,8 +379,7 @@ class ConversationRetrievalProcessor:
         Returns:
             responseType別の評価指標スコア
         """
-        # 評価指標の種類を定義
-        metric_types = ['ndcg', 'precision', 'recall']
+        metric_names = self._metric_names(k_values)
         
         # responseType別の辞書を初期化
         metrics_by_response_type = {}
@@ -332,21 +396,33 @@ class ConversationRetrievalProcessor:
                     response_type = label.get('responseType', 'unknown')
                     
                     # responseTypeが初回の場合は初期化
-                    if response_type not in metrics_by_response_type:
-                        metrics_by_response_type[response_type] = {}
-                        for metric_type in metric_types:
-                            for k in k_values:
-                                metrics_by_response_type[response_type][f'{metric_type}@{k}'] = []
+                    metrics = metrics_by_response_type.get(response_type)
+                    if metrics is None:
+                        metrics = {metric_name: [] for metric_name in metric_names}
+                        metrics_by_response_type[response_type] = metrics
                     
                     # 各評価指標を収集
-                    for metric_type in metric_types:
-                        for k in k_values:
-                            metric_name = f'{metric_type}@{k}'
-                            if metric_name in label:
-                                metrics_by_response_type[response_type][metric_name].append(label[metric_name])
+                    for key, value in label.items():
+                        scores = metrics.get(key)
+                        if scores is not None:
+                            scores.append(value)
         
         return metrics_by_response_type
     
+    def _calculate_stats(self, scores: List[float]) -> Tuple[float, float, float, float, int]:
+        """
+        スコアのリストから統計量を一度に算出
+        
+        Args:
+            scores: スコアのリスト（空でないこと）
+            
+        Returns:
+            (平均, 最大, 最小, 標準偏差, 件数) のタプル
+        """
+        # ndarrayへの変換は一度だけ行う
+        score_array = np.asarray(scores, dtype=np.float64)
+        return score_array.mean(), score_array.max(), score_array.min(), score_array.std(), score_array.size
+    
     def calculate_metrics_by_response_type(self, json_data: Dict[str, Any], k_values: List[int] = [1, 3, 5]) -> Dict[str, Dict[str, float]]:
         """
         responseType別の評価指標を算出
@@ -372,11 +448,12 @@ class ConversationRetrievalProcessor:
             # 各評価指標の統計を計算
             for metric_name, scores in metrics.items():
                 if scores:
-                    results[response_type][f'avg_{metric_name}'] = np.mean(scores)
-                    results[response_type][f'max_{metric_name}'] = np.max(scores)
-                    results[response_type][f'min_{metric_name}'] = np.min(scores)
-                    results[response_type][f'std_{metric_name}'] = np.std(scores)
-                    results[response_type][f'count_{metric_name}'] = len(scores)
+                    avg, max_, min_, std, count = self._calculate_stats(scores)
+                    results[response_type][f'avg_{metric_name}'] = avg
+                    results[response_type][f'max_{metric_name}'] = max_
+                    results[response_type][f'min_{metric_name}'] = min_
+                    results[response_type][f'std_{metric_name}'] = std
+                    results[response_type][f'count_{metric_name}'] = count
                 else:
                     results[response_type][f'avg_{metric_name}'] = 0.0
                     results[response_type][f'max_{metric_name}'] = 0.0
@@ -408,8 +485,9 @@ class ConversationRetrievalProcessor:
         for metric_name in metrics_scores_by_type.keys():
             scores = metrics_scores_by_type[metric_name]
             if scores:
-                overall_metrics[f'avg_{metric_name}'] = np.mean(scores)
-                overall_metrics[f'max_{metric_name}'] = np.max(scores)
+                score_array = np.asarray(scores, dtype=np.float64)
+                overall_metrics[f'avg_{metric_name}'] = score_array.mean()
+                overall_metrics[f'max_{metric_name}'] = score_array.max()
             else:
                 overall_metrics[f'avg_{metric_name}'] = 0.0
                 overall_metrics[f'max_{metric_name}'] = 0.0
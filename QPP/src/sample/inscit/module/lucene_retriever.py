@@ -1,8 +1,13 @@
-import json
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+import orjson
 from pyserini.search.lucene import LuceneSearcher
 
 
+# 解析済み文書をキャッシュする最大件数
+_DOC_CACHE_SIZE = 100000
+
+
 class LuceneRetriever:
     """
     Lucene検索エンジンを使用して文書を検索・取得するクラス
@@ -17,6 +22,8 @@ class LuceneRetriever:
         """
         self.index_path = index_path
         self.searcher = LuceneSearcher(index_path)
+        # 繰り返しヒットする文書の取得と解析を省略するためのキャッシュ
+        self._cached_doc = lru_cache(maxsize=_DOC_CACHE_SIZE)(self._load_doc)
     
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -35,30 +42,78 @@ class LuceneRetriever:
         # Lucene検索を実行
         hits = self.searcher.search(query, top_k)
         
-        results = []
-        for hit in hits:
-            # 文書の内容を取得
-            doc = self.searcher.doc(hit.docid)
-            
-            # 文書の内容を解析（JSON形式を想定）
-            try:
-                doc_content = json.loads(doc.raw())
-                contents = doc_content.get('contents', '')
-                title = doc_content.get('title', '')
-            except (json.JSONDecodeError, AttributeError):
-                # JSONでない場合はrawテキストを使用
-                contents = doc.raw() if hasattr(doc, 'raw') else str(doc)
-                title = doc.get('title', '') if hasattr(doc, 'get') else ''
+        return self._convert_hits(hits)
+    
+    def batch_search(self, queries: List[str], top_k: int = 5, threads: int = 8) -> List[List[Dict[str, Any]]]:
+        """
+        複数のクエリに対してLucene検索をまとめて実行
+        
+        Args:
+            queries: 検索クエリのリスト
+            top_k: 各クエリで取得する文書数
+            threads: 検索に使用するスレッド数
             
-            # タイトルを[SEP]で分割してリスト化
-            titles = title.split('[SEP]') if '[SEP]' in title else [title]
-            titles = [title.strip() for title in titles if title.strip()]
+        Returns:
+            各クエリの検索結果のリスト（queriesと同じ順序、各要素はsearchの戻り値と同じ形式）
+        """
+        if not queries:
+            return []
+        
+        # JVM側のスレッドで並列に検索を実行
+        qids = [str(i) for i in range(len(queries))]
+        hits_by_qid = self.searcher.batch_search(queries, qids, k=top_k, threads=threads)
+        
+        return [self._convert_hits(hits_by_qid.get(qid, [])) for qid in qids]
+    
+    def _convert_hits(self, hits) -> List[Dict[str, Any]]:
+        """
+        Luceneの検索ヒットを検索結果の辞書リストに変換
+        
+        Args:
+            hits: LuceneSearcherの検索ヒットのリスト
             
+        Returns:
+            検索結果のリスト
+        """
+        results = []
+        for hit in hits:
+            contents, titles = self._cached_doc(hit.docid)
             results.append({
                 'passage_id': hit.docid,
                 'passage_text': contents,
-                'passage_titles': titles,
+                'passage_titles': list(titles),
                 'score': hit.score
             })
         
-        return results 
\ No newline at end of file
+        return results
+    
+    def _load_doc(self, docid: str) -> Tuple[str, Tuple[str, ...]]:
+        """
+        文書を取得して本文とタイトルに解析
+        
+        Args:
+            docid: 文書ID
+            
+        Returns:
+            (本文, タイトルのタプル)
+        """
+        # 文書の内容を取得
+        doc = self.searcher.doc(docid)
+        
+        # 文書の内容を解析（JSON形式を想定）
+        try:
+            doc_content = orjson.loads(doc.raw())
+            contents = doc_content.get('contents', '')
+            title = doc_content.get('title', '')
+        except (orjson.JSONDecodeError, AttributeError):
+            # JSONでない場合はrawテキストを使用
+            contents = doc.raw() if hasattr(doc, 'raw') else str(doc)
+            title = doc.get('title', '') if hasattr(doc, 'get') else ''
+        
+        # タイトルを[SEP]で分割（[SEP]を含まない場合は1要素になる）
+        titles = tuple(part.strip() for part in title.split('[SEP]') if part.strip())
+        return contents, titles
+    
+    def clear_doc_cache(self) -> None:
+        """解析済み文書のキャッシュを破棄（インデックスを差し替えた場合に呼び出す）"""
+        self._cached_doc.cache_clear()
@@ -1,43 +1,240 @@
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import sys
 import os
+import hashlib
+import shutil
+from pathlib import Path
 
 # モジュールのパスを追加
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from util.logger import get_logger
 
+# ONNX形式に変換したモデルの保存先
+_ONNX_CACHE_DIR = Path.home() / ".cache" / "qpp4sip"
+
+# model.generation_configに設定する生成パラメータの既定値
+_GENERATION_DEFAULTS = {
+    'max_length': 200,
+    'num_beams': 4,
+    'repetition_penalty': 2.5,
+    'length_penalty': 1.0
+}
+
+# ウォームアップに使う代表的な対話（先頭から順に長くしたコンテキストを作り、長さの異なるバッチにする）
+_WARMUP_TURNS = [
+    "Aside from cow's milk, what other animal milk is used in making cheese?",
+    "Other sources of milk for cheese include goats and sheep's milk.",
+    "Can cheese be made from soy milk?",
+    "Yes, the main ingredients are nuts, soy milk, and soy yogurt.",
+    "When did people first start making cheese?",
+    "The production of cheese predates recorded history, beginning well over 7,000 years ago.",
+    "Do all cheeses need to be refrigerated?"
+]
+
 
 class QueryRewriter:
     """クエリ書き換えを行うクラス"""
     
-    def __init__(self, model_name: str = "castorini/t5-base-canard", device: Optional[str] = None):
+    def __init__(self, model_name: str = "castorini/t5-base-canard", device: Optional[str] = None,
+                 compile: bool = True, backend: str = "torch",
+                 assistant_model_name: Optional[str] = None, quantize: Optional[bool] = None):
         """
         初期化
         
         Args:
             model_name: 使用するモデル名
             device: 使用するデバイス（Noneの場合は自動選択）
+            compile: モデルのforwardをtorch.compileでコンパイルするかどうか（CUDA使用時のみ有効）
+            backend: 推論バックエンド（"torch"、"onnx" または "tensorrt"。"onnx"/"tensorrt"の場合はONNX Runtimeで推論）
+            assistant_model_name: rewrite_queryの推測的デコードに使う小型モデル名（例: "t5-small"、Noneの場合は使用しない）
+            quantize: Linear層をint8に動的量子化するかどうか（CPU上のtorchバックエンドのみ、NoneはCPUなら有効）
         """
+        if backend not in ("torch", "onnx", "tensorrt"):
+            raise ValueError(f"未対応のバックエンドです: {backend}")
+        if assistant_model_name is not None and backend != "torch":
+            raise ValueError("補助モデルはtorchバックエンドでのみ使用できます")
         self.model_name = model_name
+        self.backend = backend
+        self.assistant_model_name = assistant_model_name
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if backend == "tensorrt" and not self.device.startswith("cuda"):
+            raise ValueError("tensorrtバックエンドはCUDAデバイスでのみ使用できます")
+        if quantize is None:
+            quantize = backend == "torch" and not self.device.startswith("cuda")
+        if quantize and (backend != "torch" or self.device.startswith("cuda")):
+            raise ValueError("動的量子化はCPU上のtorchバックエンドでのみ使用できます")
+        self.quantize = quantize
+        self.dtype = self._select_dtype()
+        self.compile = compile and backend == "torch" and self.device.startswith("cuda")
         self.model = None
+        self.assistant = None
         self.tokenizer = None
+        # コンテキストのハッシュと生成パラメータをキーにした書き換え結果のキャッシュ
+        self._cache: Dict[Tuple, str] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
         self.logger = get_logger("QueryRewriter")
         self._load_model()
+        if self.compile:
+            self._compile_model()
+    
+    def _select_dtype(self) -> torch.dtype:
+        """デバイスに応じたモデルの精度を選択（CUDAではBF16/FP16、CPUやONNXバックエンドではFP32）"""
+        if self.backend != "torch" or not self.device.startswith("cuda"):
+            return torch.float32
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
     
     def _load_model(self):
         """モデルとトークナイザーを読み込む"""
         try:
             self.logger.progress(f"モデル '{self.model_name}' を読み込み中...")
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name).to(self.device).eval()
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.logger.success(f"モデルの読み込みが完了しました（デバイス: {self.device}）")
+            if self.backend in ("onnx", "tensorrt"):
+                self.model = self._load_onnx_model()
+            else:
+                self.model = AutoModelForSeq2SeqLM.from_pretrained(
+                    self.model_name, torch_dtype=self.dtype
+                ).to(self.device).eval()
+            if self.assistant_model_name is not None:
+                # 本体と語彙を共有する小型モデルを推測的デコードの下書き用に読み込む
+                self.assistant = AutoModelForSeq2SeqLM.from_pretrained(
+                    self.assistant_model_name, torch_dtype=self.dtype
+                ).to(self.device).eval()
+            if self.quantize:
+                # CPUではLinear層の重みをint8に動的量子化して行列積を高速化
+                self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+                if self.assistant is not None:
+                    self.assistant = torch.ao.quantization.quantize_dynamic(self.assistant, {torch.nn.Linear}, dtype=torch.qint8)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+            # 既定の生成パラメータをモデル側に設定し、呼び出しごとの指定を不要にする
+            self.model.generation_config.update(**_GENERATION_DEFAULTS, early_stopping=True, use_cache=True)
+            precision = "int8" if self.quantize else self.dtype
+            self.logger.success(f"モデルの読み込みが完了しました（デバイス: {self.device}, バックエンド: {self.backend}, 精度: {precision}）")
         except Exception as e:
             self.logger.error(f"モデルの読み込みに失敗しました: {e}")
             raise
     
+    def _load_onnx_model(self):
+        """
+        ONNX Runtimeで推論するモデルを読み込む
+        
+        初回はONNX形式に変換してキャッシュし、CPUではint8に動的量子化したモデルを使用する
+        tensorrtバックエンドではTensorRTのFP16エンジンをビルドしてキャッシュする（初回のみ時間がかかる）
+        
+        Returns:
+            generate()を持つORTModelForSeq2SeqLM
+        """
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        
+        export_dir = _ONNX_CACHE_DIR / f"{self.model_name.split('/')[-1]}-onnx"
+        if not any(export_dir.glob("*.onnx")):
+            self.logger.progress(f"ONNX形式に変換中: {export_dir}")
+            ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True).save_pretrained(export_dir)
+        
+        if self.backend == "tensorrt":
+            # TensorRTで処理できないノードはCUDAExecutionProviderで実行される
+            engine_dir = _ONNX_CACHE_DIR / f"{self.model_name.split('/')[-1]}-trt"
+            engine_dir.mkdir(parents=True, exist_ok=True)
+            return ORTModelForSeq2SeqLM.from_pretrained(
+                export_dir,
+                provider="TensorrtExecutionProvider",
+                provider_options={
+                    'trt_fp16_enable': True,
+                    'trt_engine_cache_enable': True,
+                    'trt_engine_cache_path': str(engine_dir)
+                }
+            )
+        
+        if self.device.startswith("cuda"):
+            return ORTModelForSeq2SeqLM.from_pretrained(export_dir, provider="CUDAExecutionProvider")
+        
+        # CPUではencoder/decoderそれぞれの重みをint8に動的量子化
+        quantized_dir = export_dir.with_name(f"{export_dir.name}-int8")
+        if not any(quantized_dir.glob("*.onnx")):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            
+            self.logger.progress(f"ONNXモデルを量子化中: {quantized_dir}")
+            shutil.copytree(export_dir, quantized_dir, ignore=shutil.ignore_patterns("*.onnx"), dirs_exist_ok=True)
+            for onnx_path in export_dir.glob("*.onnx"):
+                quantize_dynamic(onnx_path, quantized_dir / onnx_path.name, weight_type=QuantType.QInt8)
+        return ORTModelForSeq2SeqLM.from_pretrained(quantized_dir, provider="CPUExecutionProvider")
+    
+    def _compile_model(self):
+        """モデルのforwardをコンパイル（実際のコンパイルは初回の呼び出し時、warmupで事前に済ませられる）"""
+        # generate()はデコードの1ステップごとにforwardを呼ぶため、forwardをコンパイルしてカーネル起動のオーバーヘッドを削減
+        self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", fullgraph=False)
+    
+    def warmup(self, max_length: int = 200, batch_size: int = 8,
+               collate_fn: Optional[Callable[[List[Dict[str, List[int]]]], Dict[str, torch.Tensor]]] = None):
+        """
+        代表的なコンテキストのバッチで生成を実行し、コンパイルやGPUメモリ確保などの初回コストを事前に済ませる
+        
+        実データと同じくattention_mask付きで、batch_rewriteと同じバッチサイズ・パディングの入力を使う
+        
+        Args:
+            max_length: 生成する最大長
+            batch_size: batch_rewriteで一度に生成するコンテキスト数
+            collate_fn: batch_rewriteに渡すものと同じパディング関数（Noneの場合は最長系列に合わせてパディング）
+        """
+        if self.model is None or self.tokenizer is None:
+            raise RuntimeError("モデルが読み込まれていません")
+        if collate_fn is None:
+            collate_fn = self._default_collate
+        
+        self.logger.progress("モデルをウォームアップ中...")
+        contexts = ["|||".join(_WARMUP_TURNS[:n]) for n in range(1, len(_WARMUP_TURNS) + 1)]
+        contexts = [contexts[i % len(contexts)] for i in range(batch_size)]
+        tokenized = self.tokenizer(contexts)
+        encoded = collate_fn([
+            {'input_ids': input_ids, 'attention_mask': attention_mask}
+            for input_ids, attention_mask in zip(tokenized['input_ids'], tokenized['attention_mask'])
+        ])
+        encoded = {name: tensor.to(self.device) for name, tensor in encoded.items()}
+        # 1回目でカーネルのコンパイル等を行い、2回目で状態を安定させる
+        for _ in range(2):
+            self._generate(**encoded, **self._generation_kwargs(max_length=max_length))
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        self.logger.success("モデルのウォームアップが完了しました")
+    
+    def _generation_kwargs(self, **params) -> Dict[str, Any]:
+        """generation_configに設定済みの既定値と異なる生成パラメータのみを返す"""
+        return {name: value for name, value in params.items() if value != _GENERATION_DEFAULTS[name]}
+    
+    def _generate(self, *args, **kwargs) -> torch.Tensor:
+        """推論モードかつ選択した精度でgenerateを実行"""
+        device_type = "cuda" if self.device.startswith("cuda") else "cpu"
+        with torch.inference_mode(), torch.autocast(device_type=device_type, dtype=self.dtype,
+                                                    enabled=(self.dtype != torch.float32)):
+            return self.model.generate(*args, **kwargs)
+    
+    def _cache_key(self, context: str, *generation_params) -> Tuple:
+        """コンテキストと生成パラメータからキャッシュのキーを作成"""
+        digest = hashlib.blake2b(context.encode(), digest_size=16).hexdigest()
+        return (digest, *generation_params)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        書き換え結果キャッシュの統計を取得
+        
+        Returns:
+            hits, misses, size, hit_rateを含む辞書
+        """
+        total = self._cache_hits + self._cache_misses
+        return {
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'size': len(self._cache),
+            'hit_rate': self._cache_hits / total if total > 0 else 0.0
+        }
+    
+    def clear_cache(self):
+        """書き換え結果キャッシュと統計をクリア"""
+        self._cache.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+    
     def rewrite_query(self, context: str, max_length: int = 200, num_beams: int = 4, 
                      repetition_penalty: float = 2.5, length_penalty: float = 1.0) -> str:
         """
@@ -52,26 +249,42 @@ class QueryRewriter:
             
         Returns:
             書き換えられたクエリ
+            
+        Note:
+            補助モデルを読み込んでいる場合はnum_beamsを無視し、補助モデルによる推測的デコード（貪欲法）で生成する
         """
         if self.model is None or self.tokenizer is None:
             raise RuntimeError("モデルが読み込まれていません")
         
+        assisted = self.assistant is not None
+        key = self._cache_key(context, max_length, num_beams, repetition_penalty, length_penalty, assisted)
+        if key in self._cache:
+            self._cache_hits += 1
+            return self._cache[key]
+        self._cache_misses += 1
+        
         try:
-            # コンテキストをトークン化
-            tokenized_context = self.tokenizer.encode(context, return_tensors="pt").to(self.device)
+            # コンテキストをトークン化（attention_maskも高速トークナイザー側で作成）
+            # 末尾が現在のクエリのため、切り詰めは行わない
+            encoded = self.tokenizer(context, return_tensors="pt")
+            encoded = {name: tensor.to(self.device) for name, tensor in encoded.items()}
             
-            # クエリを生成
-            output_ids = self.model.generate(
-                tokenized_context,
+            generation_kwargs = self._generation_kwargs(
                 max_length=max_length,
                 num_beams=num_beams,
                 repetition_penalty=repetition_penalty,
-                length_penalty=length_penalty,
-                early_stopping=True
-            ).to(self.device)
+                length_penalty=length_penalty
+            )
+            if assisted:
+                # 推測的デコードはビームサーチと併用できないため貪欲法で生成
+                generation_kwargs.update(assistant_model=self.assistant, num_beams=1, do_sample=False)
+            
+            # クエリを生成
+            output_ids = self._generate(**encoded, **generation_kwargs)
             
             # トークンをデコード
             rewrite = self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
+            self._cache[key] = rewrite
             return rewrite
             
         except Exception as e:
@@ -92,25 +305,106 @@ class QueryRewriter:
         context = separator.join(texts)
         return self.rewrite_query(context)
     
-    def batch_rewrite(self, contexts: List[str]) -> List[str]:
+    def _default_collate(self, features: List[Dict[str, List[int]]]) -> Dict[str, torch.Tensor]:
+        """
+        トークン化済みのコンテキストをバッチ内の最長系列に合わせてパディング
+        
+        Args:
+            features: input_idsとattention_maskを持つ辞書のリスト
+            
+        Returns:
+            generateに渡すテンソルの辞書
+        """
+        return self.tokenizer.pad(features, padding="longest", return_tensors="pt")
+    
+    def batch_rewrite(self, contexts: List[str], batch_size: int = 8, max_length: int = 200, 
+                      num_beams: int = 4, repetition_penalty: float = 2.5, 
+                      length_penalty: float = 1.0,
+                      collate_fn: Optional[Callable[[List[Dict[str, List[int]]]], Dict[str, torch.Tensor]]] = None,
+                      verbose: bool = False) -> List[str]:
         """
         複数のコンテキストを一括で書き換える
         
+        長さの近いコンテキスト同士でバッチを組み、パディングによる無駄な計算を削減する
+        書き換え済みのコンテキストは生成を行わずキャッシュから返し、同一のコンテキストは1回のみ生成する
+        
         Args:
             contexts: 書き換えるコンテキストのリスト
+            batch_size: 一度に生成するコンテキスト数
+            max_length: 生成する最大長
+            num_beams: ビームサーチの数
+            repetition_penalty: 繰り返しペナルティ
+            length_penalty: 長さペナルティ
+            collate_fn: トークン化済みのバッチをモデル入力に変換する関数（Noneの場合は最長系列に合わせてパディング）
+            verbose: バッチごとの進捗をログに出力するかどうか
             
         Returns:
-            書き換えられたクエリのリスト
+            書き換えられたクエリのリスト（contextsと同じ順序、失敗したバッチは空文字列）
         """
-        results = []
-        for i, context in enumerate(contexts):
+        if self.model is None or self.tokenizer is None:
+            raise RuntimeError("モデルが読み込まれていません")
+        
+        if not contexts:
+            return []
+        if collate_fn is None:
+            collate_fn = self._default_collate
+        
+        generation_kwargs = self._generation_kwargs(
+            max_length=max_length,
+            num_beams=num_beams,
+            repetition_penalty=repetition_penalty,
+            length_penalty=length_penalty
+        )
+        
+        # キャッシュ済みのコンテキストは生成を省略
+        results = [""] * len(contexts)
+        keys = [
+            self._cache_key(context, max_length, num_beams, repetition_penalty, length_penalty, False)
+            for context in contexts
+        ]
+        # 同一のコンテキストは先頭の1件のみ生成し、結果を共有する
+        indices_by_key: Dict[Tuple, List[int]] = {}
+        pending = []
+        for i, key in enumerate(keys):
+            if key in self._cache:
+                results[i] = self._cache[key]
+            elif key in indices_by_key:
+                indices_by_key[key].append(i)
+            else:
+                indices_by_key[key] = [i]
+                pending.append(i)
+        self._cache_hits += len(contexts) - len(pending)
+        self._cache_misses += len(pending)
+        if not pending:
+            return results
+        
+        # 未キャッシュのコンテキストを一度だけトークン化し、長さ順に並べる
+        # （末尾が現在のクエリのため、切り詰めは行わない）
+        tokenized = self.tokenizer([contexts[i] for i in pending])
+        features = {
+            i: {'input_ids': input_ids, 'attention_mask': attention_mask}
+            for i, input_ids, attention_mask in zip(pending, tokenized['input_ids'], tokenized['attention_mask'])
+        }
+        order = sorted(pending, key=lambda i: len(features[i]['input_ids']))
+        
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
             try:
-                rewrite = self.rewrite_query(context)
-                results.append(rewrite)
-                self.logger.progress(f"処理完了: {i+1}/{len(contexts)}")
+                encoded = collate_fn([features[i] for i in batch_indices])
+                encoded = {name: tensor.to(self.device) for name, tensor in encoded.items()}
+                
+                # バッチ単位でクエリを生成
+                output_ids = self._generate(**encoded, **generation_kwargs)
+                
+                # 元の順序に戻して格納
+                for i, rewrite in zip(batch_indices, self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)):
+                    self._cache[keys[i]] = rewrite
+                    for j in indices_by_key[keys[i]]:
+                        results[j] = rewrite
+                if verbose:
+                    self.logger.progress(f"処理完了: {start + len(batch_indices)}/{len(order)}")
             except Exception as e:
-                self.logger.error(f"コンテキスト {i+1} の処理に失敗: {e}")
-                results.append("")
+                self.logger.error(f"バッチ {start // batch_size + 1} の処理に失敗: {e}")
         return results
 
 
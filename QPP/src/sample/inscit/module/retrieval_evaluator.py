@@ -1,6 +1,17 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, FrozenSet, Optional
 import numpy as np
 
+# 順位iに対する割引係数 1/log2(i+2) の事前計算テーブル
+_MAX_K = 100
+_DISCOUNTS = 1.0 / np.log2(np.arange(2, _MAX_K + 2))
+
+
+def _get_discounts(n: int) -> np.ndarray:
+    """上位n件分の割引係数を取得（テーブルを超える場合はその場で計算）"""
+    if n <= _MAX_K:
+        return _DISCOUNTS[:n]
+    return 1.0 / np.log2(np.arange(2, n + 2))
+
 
 class RetrievalEvaluator:
     """
@@ -11,7 +22,7 @@ class RetrievalEvaluator:
         """検索評価指標を初期化"""
         pass
     
-    def _get_gold_ids(self, gold_evidence: List[Dict[str, Any]]) -> set:
+    def _get_gold_ids(self, gold_evidence: List[Dict[str, Any]]) -> FrozenSet[str]:
         """
         ゴールド文書のIDセットを取得
         
@@ -27,7 +38,47 @@ class RetrievalEvaluator:
                 gold_ids.add(evidence['passage_id'])
             elif isinstance(evidence, str):
                 gold_ids.add(evidence)
-        return gold_ids
+        return frozenset(gold_ids)
+    
+    def _count_relevant(self, retrieved_ids: List[str], gold_ids: FrozenSet[str]) -> int:
+        """検索された文書IDのうち、ゴールド文書の数をカウント"""
+        return sum(1 for passage_id in retrieved_ids if passage_id in gold_ids)
+    
+    def _precision_at_k(self, retrieved_ids: List[str], gold_ids: FrozenSet[str], k: int) -> float:
+        """構築済みのゴールド文書IDセットを用いてPrecision@kを算出"""
+        return self._count_relevant(retrieved_ids[:k], gold_ids) / k if k > 0 else 0.0
+    
+    def _recall_at_k(self, retrieved_ids: List[str], gold_ids: FrozenSet[str], k: int) -> float:
+        """構築済みのゴールド文書IDセットを用いてRecall@kを算出"""
+        if len(gold_ids) == 0:
+            return 0.0
+        return self._count_relevant(retrieved_ids[:k], gold_ids) / len(gold_ids)
+    
+    def _ndcg_at_k(self, retrieved_ids: List[str], gold_ids: FrozenSet[str], k: int) -> float:
+        """構築済みのゴールド文書IDセットを用いてnDCG@kを算出"""
+        top_ids = retrieved_ids[:k]
+        num_gold = min(len(gold_ids), k)
+        discounts = _get_discounts(max(len(top_ids), num_gold))
+        
+        dcg = 0.0
+        for i, passage_id in enumerate(top_ids):
+            if passage_id in gold_ids:
+                relevance = 1.0
+            else:
+                relevance = 0.0
+            
+            dcg += relevance * discounts[i]
+        
+        # 理想的なDCG（IDCG）を計算
+        idcg = 0.0
+        for i in range(num_gold):
+            idcg += discounts[i]
+        
+        # nDCGを計算
+        if idcg == 0:
+            return 0.0
+        
+        return dcg / idcg
     
     def calculate_precision_at_k(self, retrieved_evidence: List[Dict[str, Any]], 
                                 gold_evidence: List[Dict[str, Any]], 
@@ -46,15 +97,8 @@ class RetrievalEvaluator:
         if k is None:
             k = len(retrieved_evidence)
         
-        gold_ids = self._get_gold_ids(gold_evidence)
-        
-        # 上位k件のうち、ゴールド文書の数をカウント
-        relevant_count = 0
-        for doc in retrieved_evidence[:k]:
-            if doc['passage_id'] in gold_ids:
-                relevant_count += 1
-        
-        return relevant_count / k if k > 0 else 0.0
+        retrieved_ids = [doc['passage_id'] for doc in retrieved_evidence[:k]]
+        return self._precision_at_k(retrieved_ids, self._get_gold_ids(gold_evidence), k)
     
     def calculate_recall_at_k(self, retrieved_evidence: List[Dict[str, Any]], 
                              gold_evidence: List[Dict[str, Any]], 
@@ -73,18 +117,8 @@ class RetrievalEvaluator:
         if k is None:
             k = len(retrieved_evidence)
         
-        gold_ids = self._get_gold_ids(gold_evidence)
-        
-        if len(gold_ids) == 0:
-            return 0.0
-        
-        # 上位k件のうち、ゴールド文書の数をカウント
-        relevant_count = 0
-        for doc in retrieved_evidence[:k]:
-            if doc['passage_id'] in gold_ids:
-                relevant_count += 1
-        
-        return relevant_count / len(gold_ids)
+        retrieved_ids = [doc['passage_id'] for doc in retrieved_evidence[:k]]
+        return self._recall_at_k(retrieved_ids, self._get_gold_ids(gold_evidence), k)
     
     def calculate_ndcg(self, retrieved_evidence: List[Dict[str, Any]], 
                       gold_evidence: List[Dict[str, Any]], 
@@ -103,59 +137,90 @@ class RetrievalEvaluator:
         if k is None:
             k = len(retrieved_evidence)
         
-        gold_ids = self._get_gold_ids(gold_evidence)
+        retrieved_ids = [doc['passage_id'] for doc in retrieved_evidence[:k]]
+        return self._ndcg_at_k(retrieved_ids, self._get_gold_ids(gold_evidence), k)
+    
+    def prepare_for_results(self, retrieved_evidence: List[Dict[str, Any]], 
+                            k_values: List[int] = [1, 3, 5]) -> Dict[str, Any]:
+        """
+        検索結果のみに依存する値を事前計算（同じ検索結果に対する複数labelの評価で再利用）
         
-        dcg = 0.0
-        for i, doc in enumerate(retrieved_evidence[:k]):
-            if doc['passage_id'] in gold_ids:
-                relevance = 1.0
-            else:
-                relevance = 0.0
+        Args:
+            retrieved_evidence: 検索で取得された文書のリスト
+            k_values: 評価するk値のリスト
             
-            dcg += relevance / np.log2(i + 2)
-        
-        # 理想的なDCG（IDCG）を計算
-        idcg = 0.0
-        num_gold = min(len(gold_ids), k)
-        for i in range(num_gold):
-            idcg += 1.0 / np.log2(i + 2)
-        
-        # nDCGを計算
-        if idcg == 0:
-            return 0.0
-        
-        return dcg / idcg
+        Returns:
+            calculate_all_metrics_with_ctxに渡すコンテキスト
+        """
+        max_k = max(k_values) if k_values else 0
+        return {
+            'k_values': k_values,
+            'retrieved_ids': [doc['passage_id'] for doc in retrieved_evidence[:max_k]],
+            'discounts': _get_discounts(max_k)
+        }
     
-    def calculate_all_metrics(self, retrieved_evidence: List[Dict[str, Any]], 
-                             gold_evidence: List[Dict[str, Any]], 
-                             k_values: List[int] = [1, 3, 5]) -> Dict[str, float]:
+    def calculate_all_metrics_with_ctx(self, ctx: Dict[str, Any], 
+                                       gold_evidence: List[Dict[str, Any]]) -> Dict[str, float]:
         """
-        全ての評価指標を一度に算出
+        事前計算したコンテキストを用いて全ての評価指標を算出
         
         Args:
-            retrieved_evidence: 検索で取得された文書のリスト
+            ctx: prepare_for_resultsで作成したコンテキスト
             gold_evidence: ゴールド文書のリスト
-            k_values: 評価するk値のリスト
             
         Returns:
             各評価指標のスコアを含む辞書
         """
+        k_values = ctx['k_values']
+        discounts = ctx['discounts']
+        retrieved_ids = ctx['retrieved_ids']
+        gold_ids = self._get_gold_ids(gold_evidence)
+        num_gold = len(gold_ids)
+        num_retrieved = len(retrieved_ids)
+        hits = np.fromiter((passage_id in gold_ids for passage_id in retrieved_ids),
+                           dtype=np.float64, count=num_retrieved)
+        
+        # 上位n件までの累積値（先頭の0は上位0件に対応）
+        hit_cum = np.concatenate(([0.0], np.cumsum(hits)))
+        dcg_cum = np.concatenate(([0.0], np.cumsum(hits * discounts[:num_retrieved])))
+        idcg_cum = np.concatenate(([0.0], np.cumsum(discounts[:num_gold])))
+        
         results = {}
         
         # nDCG@k
         for k in k_values:
-            results[f'ndcg@{k}'] = self.calculate_ndcg(retrieved_evidence, gold_evidence, k)
+            dcg = dcg_cum[min(k, num_retrieved)]
+            # 理想的なDCG（IDCG）
+            idcg = idcg_cum[min(num_gold, k)]
+            results[f'ndcg@{k}'] = float(dcg / idcg) if idcg != 0 else 0.0
         
         # Precision@k
         for k in k_values:
-            results[f'precision@{k}'] = self.calculate_precision_at_k(retrieved_evidence, gold_evidence, k)
+            results[f'precision@{k}'] = float(hit_cum[min(k, num_retrieved)] / k) if k > 0 else 0.0
         
         # Recall@k
         for k in k_values:
-            results[f'recall@{k}'] = self.calculate_recall_at_k(retrieved_evidence, gold_evidence, k)
+            results[f'recall@{k}'] = float(hit_cum[min(k, num_retrieved)] / num_gold) if num_gold > 0 else 0.0
         
         return results
     
+    def calculate_all_metrics(self, retrieved_evidence: List[Dict[str, Any]], 
+                             gold_evidence: List[Dict[str, Any]], 
+                             k_values: List[int] = [1, 3, 5]) -> Dict[str, float]:
+        """
+        全ての評価指標を一度に算出
+        
+        Args:
+            retrieved_evidence: 検索で取得された文書のリスト
+            gold_evidence: ゴールド文書のリスト
+            k_values: 評価するk値のリスト
+            
+        Returns:
+            各評価指標のスコアを含む辞書
+        """
+        ctx = self.prepare_for_results(retrieved_evidence, k_values)
+        return self.calculate_all_metrics_with_ctx(ctx, gold_evidence)
+    
     def calculate_ndcg_multiple_k(self, retrieved_evidence: List[Dict[str, Any]], 
                                  gold_evidence: List[Dict[str, Any]], 
                                  k_values: List[int] = [1, 3, 5]) -> Dict[str, float]:
@@ -170,7 +235,12 @@ class RetrievalEvaluator:
         Returns:
             各k値でのnDCGスコアを含む辞書
         """
+        # ゴールド文書IDセットと検索文書IDは全てのk値で共通のため一度だけ作成
+        gold_ids = self._get_gold_ids(gold_evidence)
+        max_k = max(k_values) if k_values else 0
+        retrieved_ids = [doc['passage_id'] for doc in retrieved_evidence[:max_k]]
+        
         results = {}
         for k in k_values:
-            results[f'ndcg@{k}'] = self.calculate_ndcg(retrieved_evidence, gold_evidence, k)
+            results[f'ndcg@{k}'] = self._ndcg_at_k(retrieved_ids, gold_ids, k)
         return results 
\ No newline at end of file
@@ -1,6 +1,8 @@
+import argparse
 import os
 import sys
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from tqdm import tqdm
 
 # モジュールのパスを追加
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -13,18 +15,29 @@ from module.query_rewriter import QueryRewriter
 class DataPreprocessor:
     """データの前処理を行うクラス"""
     
-    def __init__(self, input_file_path: str):
+    def __init__(self, input_file_path: str, dialogue_batch_size: int = 64, 
+                 rewrite_batch_size: int = 8, verbose: bool = False):
         """
         初期化
         
         Args:
             input_file_path: 入力JSONファイルのパス
+            dialogue_batch_size: クエリ書き換えをまとめて行うダイアログ数
+            rewrite_batch_size: クエリ書き換えで一度に生成するコンテキスト数
+            verbose: turnごとの元のクエリと書き換えクエリ、クエリ書き換えのバッチごとの進捗をログに出力するかどうか
         """
         self.input_file_path = input_file_path
+        self.dialogue_batch_size = dialogue_batch_size
+        self.rewrite_batch_size = rewrite_batch_size
+        self.verbose = verbose
         self.output_file_path = self._generate_output_path()
         self.data_loader = DataLoader(input_file_path)
         self.query_rewriter = QueryRewriter()
         self.logger = get_logger("DataPreprocessor")
+        # 初回のコンパイルやGPUメモリ確保のコストが最初のダイアログの処理に乗らないよう事前に済ませる
+        # （CPUなど事前に済ませるものがない場合は起動を遅くするだけなので行わない）
+        if self.query_rewriter.compile or self.query_rewriter.device.startswith("cuda"):
+            self.query_rewriter.warmup(batch_size=self.rewrite_batch_size)
     
     def _generate_output_path(self) -> str:
         """出力ファイルのパスを生成"""
@@ -37,103 +50,150 @@ class DataPreprocessor:
         """
         ダイアログを処理する
         
+        各turnにqueryとresolvedQueryを追加するのみのため、コピーせずdialogueを直接更新する
+        
         Args:
             dialogue: 処理するダイアログ
             
         Returns:
-            処理されたダイアログ
+            処理されたダイアログ（dialogueと同じオブジェクト）
         """
-        processed_dialogue = dialogue.copy()
-        turns = self.data_loader.get_turns(dialogue)
-        
-        self.logger.info(f"ターン数: {len(turns)}")
+        self.process_dialogues([("", dialogue)])
+        return dialogue
+    
+    def process_dialogues(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        複数のダイアログの全turnのクエリを1回のbatch_rewriteでまとめて書き換える
         
-        for i, turn in enumerate(turns):
-            self.logger.progress(f"ターン {i+1} を処理中...")
-            
-            # contextを取得
-            context = self.data_loader.get_context(turn)
+        Args:
+            items: (ダイアログキー, ダイアログ)のタプルのリスト（各ダイアログは直接更新される）
             
-            if context:
-                # contextの最後の要素をqueryとして抽出
-                query = context[-1]
-                turn['query'] = query
-                
-                # context全体を入力としてquery rewriteを実行
-                try:
-                    context_text = "|||".join(context)
-                    resolved_query = self.query_rewriter.rewrite_query(context_text)
-                    turn['resolvedQuery'] = resolved_query
-                    
-                    self.logger.info(f"  元のクエリ: {query}")
-                    self.logger.info(f"  書き換えクエリ: {resolved_query}")
+        Returns:
+            処理されたitems（構造が不正なダイアログは元のまま）
+        """
+        # 全ダイアログから書き換え対象のturnとcontextを先に集める
+        targets = []
+        context_texts = []
+        for dialogue_key, dialogue in items:
+            try:
+                dialogue_targets = []
+                dialogue_contexts = []
+                for i, turn in enumerate(self.data_loader.get_turns(dialogue)):
+                    # contextを取得
+                    context = self.data_loader.get_context(turn)
                     
-                except Exception as e:
-                    self.logger.error(f"  クエリ書き換えに失敗: {e}")
-                    turn['resolvedQuery'] = query  # 失敗時は元のクエリを使用
+                    if context:
+                        # contextの最後の要素をqueryとして抽出
+                        turn['query'] = context[-1]
+                        dialogue_targets.append((dialogue_key, i, turn))
+                        dialogue_contexts.append("|||".join(context))
+                    else:
+                        self.logger.warning(f"  {self._turn_label(dialogue_key, i)}: コンテキストが見つかりません")
+                        turn['query'] = ""
+                        turn['resolvedQuery'] = ""
+            except Exception as e:
+                self.logger.error(f"ダイアログ {dialogue_key} の処理中にエラーが発生しました: {e}")
+                # エラーが発生しても処理を続行
+                continue
+            targets.extend(dialogue_targets)
+            context_texts.extend(dialogue_contexts)
+        
+        # context全体を入力として全turnのquery rewriteを一括で実行
+        resolved_queries = self.query_rewriter.batch_rewrite(context_texts, batch_size=self.rewrite_batch_size,
+                                                            verbose=self.verbose)
+        
+        for (dialogue_key, i, turn), resolved_query in zip(targets, resolved_queries):
+            query = turn['query']
+            
+            if resolved_query:
+                turn['resolvedQuery'] = resolved_query
+                if self.verbose:
+                    self.logger.info(f"  {self._turn_label(dialogue_key, i)} 元のクエリ: {query}")
+                    self.logger.info(f"  {self._turn_label(dialogue_key, i)} 書き換えクエリ: {resolved_query}")
             else:
-                self.logger.warning(f"  コンテキストが見つかりません")
-                turn['query'] = ""
-                turn['resolvedQuery'] = ""
+                self.logger.error(f"  {self._turn_label(dialogue_key, i)}: クエリ書き換えに失敗")
+                turn['resolvedQuery'] = query  # 失敗時は元のクエリを使用
         
-        return processed_dialogue
+        return items
     
-    def process_data(self, start_index: int = 0, end_index: Optional[int] = None) -> Dict[str, Any]:
+    def _turn_label(self, dialogue_key: str, turn_index: int) -> str:
+        """ログ出力用のturnの表記を作成"""
+        if dialogue_key:
+            return f"ダイアログ {dialogue_key} ターン {turn_index+1}"
+        return f"ターン {turn_index+1}"
+    
+    def iter_processed_dialogues(self, start_index: int = 0,
+                                 end_index: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
         """
-        データを処理する
+        ダイアログを先頭から1件ずつ読み込み、指定範囲のものを処理して返す
+        
+        dialogue_batch_size件ごとにまとめてクエリを書き換えるため、メモリ上に保持するのはその件数分のみ
         
         Args:
             start_index: 処理開始インデックス（デフォルト: 0）
             end_index: 処理終了インデックス（Noneの場合は最後まで）
             
-        Returns:
-            処理されたデータ
+        Yields:
+            (ダイアログキー, ダイアログ)のタプル（範囲外のダイアログは元のまま）
         """
         self.logger.section("データ処理開始")
         self.logger.info(f"入力ファイル: {self.input_file_path}")
         self.logger.info(f"出力ファイル: {self.output_file_path}")
+        self.logger.info(f"処理対象範囲: {start_index} から {'最後' if end_index is None else end_index-1} まで")
+        
+        # 終了インデックスの指定がない場合はダイアログ数を数えて進捗の総数とする
+        total_dialogues = len(self.data_loader) if end_index is None else end_index
+        progress = tqdm(total=max(0, total_dialogues - start_index), desc="dialogues", unit="dialogue")
+        pending = []
+        total_keys = 0
+        for i, item in enumerate(self.data_loader.iter_dialogues()):
+            total_keys += 1
+            if i < start_index or (end_index is not None and i >= end_index):
+                # 出力順を保つため、範囲外のダイアログの前に処理待ちのダイアログを書き換える
+                if pending:
+                    yield from self.process_dialogues(pending)
+                    progress.update(len(pending))
+                    pending = []
+                yield item
+                continue
+            
+            pending.append(item)
+            if len(pending) >= self.dialogue_batch_size:
+                yield from self.process_dialogues(pending)
+                progress.update(len(pending))
+                pending = []
         
-        # 元のデータを取得
-        original_data = self.data_loader.get_data()
-        processed_data = original_data.copy()
-        
-        # 処理対象のキーを取得
-        top_keys = self.data_loader.get_top_keys()
-        total_keys = len(top_keys)
-        
-        # 終了インデックスを設定
-        if end_index is None:
-            end_index = total_keys
+        if pending:
+            yield from self.process_dialogues(pending)
+            progress.update(len(pending))
+        progress.close()
         
         self.logger.info(f"総ダイアログ数: {total_keys}")
-        self.logger.info(f"処理対象範囲: {start_index} から {end_index-1} まで")
-        self.logger.info(f"処理対象数: {end_index - start_index}")
+        self.logger.success("すべてのデータ処理が完了しました")
+    
+    def process_data(self, start_index: int = 0, end_index: Optional[int] = None) -> Dict[str, Any]:
+        """
+        データを処理する
         
-        # 指定された範囲のダイアログを処理
-        for i in range(start_index, end_index):
-            try:
-                dialogue_key = top_keys[i]
-                self.logger.subsection(f"ダイアログ {i+1}/{end_index} を処理中")
-                self.logger.info(f"ダイアログキー: {dialogue_key}")
-                
-                # ダイアログを取得
-                dialogue = self.data_loader.get_dialogue_by_key(dialogue_key)
-                
-                # ダイアログを処理
-                processed_dialogue = self.process_dialogue(dialogue)
-                
-                # 処理されたダイアログで元のデータを更新
-                processed_data[dialogue_key] = processed_dialogue
-                
-                self.logger.success(f"ダイアログ {i+1} の処理が完了しました")
-                
-            except Exception as e:
-                self.logger.error(f"ダイアログ {i+1} の処理中にエラーが発生しました: {e}")
-                # エラーが発生しても処理を続行
-                continue
+        Args:
+            start_index: 処理開始インデックス（デフォルト: 0）
+            end_index: 処理終了インデックス（Noneの場合は最後まで）
+            
+        Returns:
+            処理されたデータ
+        """
+        return dict(self.iter_processed_dialogues(start_index, end_index))
+    
+    def process_and_save(self, start_index: int = 0, end_index: Optional[int] = None):
+        """
+        データを処理しながら、処理済みのダイアログを順次出力ファイルへ書き出す
         
-        self.logger.success("すべてのデータ処理が完了しました")
-        return processed_data
+        Args:
+            start_index: 処理開始インデックス（デフォルト: 0）
+            end_index: 処理終了インデックス（Noneの場合は最後まで）
+        """
+        self.data_loader.save_data_stream(self.iter_processed_dialogues(start_index, end_index),
+                                          self.output_file_path)
     
     def save_processed_data(self, processed_data: Dict[str, Any]):
         """処理されたデータを保存"""
@@ -147,18 +207,20 @@ class DataPreprocessor:
 
 def main():
     """メイン関数"""
+    parser = argparse.ArgumentParser(description='ダイアログの各turnのクエリを書き換えます')
+    parser.add_argument('--verbose', action='store_true',
+                        help='turnごとの書き換え結果とクエリ書き換えのバッチごとの進捗をログに出力する')
+    args = parser.parse_args()
+    
     input_file_path = '/mnt/disk6/daiki/Datasets/INSCIT/data/test.json' # FIXME: ファイル名を変更
     logger = get_logger("DataPreprocessorMain")
     
     try:
         # DataPreprocessorインスタンスを作成
-        preprocessor = DataPreprocessor(input_file_path)
-        
-        # データを処理（すべてのダイアログ）
-        processed_data = preprocessor.process_data()
+        preprocessor = DataPreprocessor(input_file_path, verbose=args.verbose)
         
-        # 処理されたデータを保存
-        preprocessor.save_processed_data(processed_data)
+        # データを処理しながら保存（すべてのダイアログ）
+        preprocessor.process_and_save()
         
         logger.success("すべての処理が完了しました！")
         
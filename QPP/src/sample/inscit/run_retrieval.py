@@ -2,7 +2,6 @@
 """
 会話データに対する検索処理のエントリポイント
 """
-import json
 from module.lucene_retriever import LuceneRetriever
 from module.conversation_retrieval_processor import ConversationRetrievalProcessor
 
@@ -18,16 +17,11 @@ def main():
     processor = ConversationRetrievalProcessor(retriever)
     
     # 処理を実行（nDCG@1, @3, @5を計算）
-    output_path = processor.process_json_file(
-        input_file_path, 
-        calculate_ndcg=True, 
-        k_values=[1, 3, 5]
-    )
-    
-    # 全体の評価指標を算出
-    with open(output_path, 'r', encoding='utf-8') as f:
-        processed_data = json.load(f)
+    data = processor.load_json_file(input_file_path)
+    processed_data = processor.process_data(data, calculate_ndcg=True, k_values=[1, 3, 5])
+    output_path = processor.save_json_file(processed_data, input_file_path)
     
+    # 全体の評価指標を算出（保存したファイルを再度読み込まずにメモリ上のデータを使用）
     overall_metrics = processor.calculate_overall_metrics(processed_data, k_values=[1, 3, 5])
     
     # responseType別の評価指標を算出
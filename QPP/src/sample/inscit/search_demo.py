@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import json
+import orjson
 import argparse
 from pyserini.search.lucene import LuceneSearcher
 
@@ -49,7 +49,7 @@ def search_demo(index_path: str, top_k: int = 5):
                     
                     # ドキュメント内容を取得
                     doc = searcher.doc(hit.docid)
-                    parsed_doc = json.loads(doc.raw())
+                    parsed_doc = orjson.loads(doc.raw())
                     
                     # 内容を表示
                     if 'contents' in parsed_doc:
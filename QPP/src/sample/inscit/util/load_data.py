@@ -1,5 +1,6 @@
-import json
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+import ijson
+import orjson
 from .logger import get_logger
 
 
@@ -10,38 +11,82 @@ class DataLoader:
         """
         初期化
         
+        データ全体の読み込みはランダムアクセスが必要になった時点まで遅延する
+        
         Args:
             file_path: 読み込むJSONファイルのパス
         """
         self.file_path = file_path
         self.data = None
+        self._num_dialogues = None
         self.logger = get_logger("DataLoader")
-        self._load_data()
     
     def _load_data(self):
-        """JSONデータを読み込む"""
+        """JSONデータ全体を読み込む"""
         try:
-            with open(self.file_path, 'r') as f:
-                self.data = json.load(f)
+            with open(self.file_path, 'rb') as f:
+                self.data = orjson.loads(f.read())
             self.logger.success(f"データを正常に読み込みました: {self.file_path}")
         except Exception as e:
             self.logger.error(f"データの読み込みに失敗しました: {e}")
             raise
     
+    def _ensure_loaded(self):
+        """データ全体が未読み込みであれば読み込む"""
+        if self.data is None:
+            self._load_data()
+    
+    def iter_dialogues(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        ダイアログを先頭から順に1件ずつ取得
+        
+        データ全体が未読み込みの場合はファイルを逐次パースし、メモリ上には1ダイアログ分のみ保持する
+        
+        Yields:
+            (ダイアログキー, ダイアログ)のタプル
+        """
+        if self.data is not None:
+            yield from self.data.items()
+            return
+        
+        try:
+            with open(self.file_path, 'rb') as f:
+                yield from ijson.kvitems(f, '', use_float=True)
+        except Exception as e:
+            self.logger.error(f"データの読み込みに失敗しました: {e}")
+            raise
+    
+    def __len__(self) -> int:
+        """
+        ダイアログ数を取得
+        
+        データ全体が未読み込みの場合はファイルを逐次パースして最上位のキーのみを数える（結果は保持して再利用する）
+        """
+        if self.data is not None:
+            return len(self.data)
+        if self._num_dialogues is None:
+            try:
+                with open(self.file_path, 'rb') as f:
+                    self._num_dialogues = sum(1 for prefix, event, _ in ijson.parse(f)
+                                              if prefix == '' and event == 'map_key')
+            except Exception as e:
+                self.logger.error(f"データの読み込みに失敗しました: {e}")
+                raise
+        return self._num_dialogues
+    
     def get_data(self) -> Dict[str, Any]:
         """読み込んだデータを取得"""
+        self._ensure_loaded()
         return self.data
     
     def get_top_keys(self) -> List[str]:
         """最上位のキーを取得"""
-        if self.data is None:
-            raise RuntimeError("データが読み込まれていません")
+        self._ensure_loaded()
         return list(self.data.keys())
     
     def get_dialogue_by_key(self, key: str) -> Dict[str, Any]:
         """指定されたキーのダイアログを取得"""
-        if self.data is None:
-            raise RuntimeError("データが読み込まれていません")
+        self._ensure_loaded()
         if key not in self.data:
             raise KeyError(f"キー '{key}' が見つかりません")
         return self.data[key]
@@ -77,11 +122,54 @@ class DataLoader:
             raise KeyError("'context'キーが見つかりません")
         return turn['context']
     
-    def save_data(self, data: Dict[str, Any], output_path: str):
-        """データをJSONファイルとして保存"""
+    def _dumps_option(self, pretty: bool) -> int:
+        """orjsonの出力オプションを取得"""
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+    
+    def save_data(self, data: Dict[str, Any], output_path: str, pretty: bool = True):
+        """
+        データをJSONファイルとして保存
+        
+        Args:
+            data: 保存するデータ
+            output_path: 出力ファイルのパス
+            pretty: インデント付きで出力するかどうか（Falseの場合は改行・空白なしで出力）
+        """
+        try:
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=self._dumps_option(pretty)))
+            self.logger.success(f"データを保存しました: {output_path}")
+        except Exception as e:
+            self.logger.error(f"データの保存に失敗しました: {e}")
+            raise
+    
+    def save_data_stream(self, items: Iterable[Tuple[str, Dict[str, Any]]], output_path: str,
+                         pretty: bool = True):
+        """
+        (キー, ダイアログ)を受け取るたびにJSONファイルへ逐次書き出す
+        
+        出力はsave_dataと同じ形式になる
+        
+        Args:
+            items: (ダイアログキー, ダイアログ)のタプルを返すイテラブル
+            output_path: 出力ファイルのパス
+            pretty: インデント付きで出力するかどうか（Falseの場合は改行・空白なしで出力）
+        """
+        option = self._dumps_option(pretty)
+        indent = b'\n  ' if pretty else b''
+        key_separator = b': ' if pretty else b':'
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(output_path, 'wb') as f:
+                f.write(b'{')
+                count = 0
+                for key, value in items:
+                    value_json = orjson.dumps(value, option=option)
+                    if pretty:
+                        # 最上位オブジェクトの要素として1段深くインデントする
+                        value_json = value_json.replace(b'\n', b'\n  ')
+                    f.write((b',' if count else b'') + indent + orjson.dumps(key) + key_separator + value_json)
+                    count += 1
+                f.write(b'\n}' if pretty and count else b'}')
             self.logger.success(f"データを保存しました: {output_path}")
         except Exception as e:
             self.logger.error(f"データの保存に失敗しました: {e}")
@@ -1,12 +1,145 @@
+import atexit
 import logging
+import os
+import queue
 import sys
-from typing import Optional
+import threading
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+from typing import Dict, Optional
 from datetime import datetime
 
 
+# ファイルへの出力はプロセスで1つのリスナースレッドにまとめて行う（ロガー名ごとのファイル用ハンドラー）
+_file_handlers: Dict[str, logging.Handler] = {}
+_file_queue_handler = None
+_file_listener = None
+_file_lock = threading.Lock()
+
+
+class LazyFileHandler(logging.Handler):
+    """最初のログ出力時に初めてログファイル（とそのディレクトリ）を作成するハンドラー"""
+    
+    def __init__(self, filename: str, encoding: str = 'utf-8'):
+        """
+        初期化
+        
+        Args:
+            filename: ログファイルのパス
+            encoding: ログファイルのエンコーディング
+        """
+        super().__init__()
+        self.filename = filename
+        self.encoding = encoding
+        self._handler = None
+    
+    def emit(self, record: logging.LogRecord):
+        """ログを出力（初回のみ実際のFileHandlerを作成する）"""
+        try:
+            if self._handler is None:
+                directory = os.path.dirname(self.filename)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._handler = logging.FileHandler(self.filename, encoding=self.encoding)
+                self._handler.setFormatter(self.formatter)
+            self._handler.emit(record)
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self):
+        """ファイルが作成済みであれば書き出す"""
+        if self._handler is not None:
+            self._handler.flush()
+    
+    def close(self):
+        """ファイルが作成済みであれば閉じる"""
+        if self._handler is not None:
+            self._handler.close()
+        super().close()
+
+
+class _FileRouter(logging.Handler):
+    """リスナースレッドで受け取ったログを、ロガー名に対応するファイル用ハンドラーへ渡すハンドラー"""
+    
+    def emit(self, record: logging.LogRecord):
+        """ログを出力"""
+        handler = _file_handlers.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
+
+class _FileQueueHandler(QueueHandler):
+    """ファイル用のログをキューに積むハンドラー（最初のログ出力時にリスナースレッドを開始する）"""
+    
+    def enqueue(self, record: logging.LogRecord):
+        """ログをキューに積む"""
+        if _file_listener is None:
+            _start_file_listener()
+        super().enqueue(record)
+
+
+def _start_file_listener():
+    """ファイル用のリスナースレッドを開始（開始済みの場合は何もしない）"""
+    global _file_listener
+    with _file_lock:
+        if _file_listener is None:
+            _file_listener = QueueListener(_get_file_queue_handler().queue, _FileRouter())
+            _file_listener.start()
+
+
+def _get_file_queue_handler() -> QueueHandler:
+    """プロセスで共有するファイル用のQueueHandlerを取得"""
+    global _file_queue_handler
+    if _file_queue_handler is None:
+        _file_queue_handler = _FileQueueHandler(queue.Queue(-1))
+    return _file_queue_handler
+
+
+def _flush_file_queue():
+    """キューに積まれたファイル用のログがすべてファイル用ハンドラーに渡されるまで待つ"""
+    if _file_listener is not None:
+        _file_queue_handler.queue.join()
+
+
+def _shutdown_file_logging():
+    """リスナースレッドを停止し、未書き込みのログをすべてファイルへ書き出す（終了時に1回だけ呼ばれる）"""
+    global _file_listener
+    with _file_lock:
+        if _file_listener is not None:
+            _file_listener.stop()
+            _file_listener = None
+    for handler in list(_file_handlers.values()):
+        handler.flush()
+
+
+def _reset_file_logging_after_fork():
+    """
+    fork後の子プロセスでファイル出力の状態を初期化
+    
+    リスナースレッドは子プロセスに引き継がれないため、キューを作り直して最初のログ出力時に再開する
+    親プロセスがメモリ上にまとめているログは親プロセスが書き出すため、子プロセスでは破棄する
+    """
+    global _file_listener, _file_lock
+    _file_listener = None
+    _file_lock = threading.Lock()
+    if _file_queue_handler is not None:
+        _file_queue_handler.queue = queue.Queue(-1)
+    for handler in _file_handlers.values():
+        if isinstance(handler, MemoryHandler):
+            handler.buffer = []
+
+
+atexit.register(_shutdown_file_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_file_logging_after_fork)
+
+
 class Logger:
     """ログ表示のためのクラス"""
     
+    # セクション・サブセクションの区切り線
+    _SECTION_BAR = '=' * 50
+    _SUBSECTION_BAR = '-' * 30
+    
     def __init__(self, name: str = "QPP", level: int = logging.INFO, 
                  log_to_file: bool = False, log_file: Optional[str] = None):
         """
@@ -21,6 +154,7 @@ class Logger:
         self.name = name
         self.level = level
         self.log_to_file = log_to_file
+        self._memory_handler = None
         
         # ロガーを作成
         self.logger = logging.getLogger(name)
@@ -35,11 +169,11 @@ class Logger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
-        # コンソールハンドラーを追加
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(level)
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        # コンソールハンドラーを追加（print()の出力と混ざらないよう呼び出し元のスレッドで出力する）
+        self._console_handler = logging.StreamHandler(sys.stdout)
+        self._console_handler.setLevel(level)
+        self._console_handler.setFormatter(formatter)
+        self.logger.addHandler(self._console_handler)
         
         # ファイルハンドラーを追加（必要に応じて）
         if log_to_file:
@@ -47,14 +181,39 @@ class Logger:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 log_file = f"logs/{name}_{timestamp}.log"
             
-            # ログディレクトリを作成
-            import os
-            os.makedirs(os.path.dirname(log_file), exist_ok=True)
-            
-            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+            # ログディレクトリとファイルは最初にファイルへログを書き込む時点で作成する
+            file_handler = LazyFileHandler(log_file, encoding='utf-8')
             file_handler.setLevel(level)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
+            
+            # ファイルへはメモリ上にまとめてから書き込む（ERROR以上は即座に書き込む）
+            self._memory_handler = MemoryHandler(capacity=1024, flushLevel=logging.ERROR,
+                                                 target=file_handler, flushOnClose=True)
+            self._memory_handler.setLevel(level)
+            
+            # 呼び出し側はキューに積むだけにし、ファイルへの出力はリスナースレッドで行う
+            # （同じ名前のロガーを作り直した場合は、以前のファイル用ハンドラーを書き出してから置き換える）
+            _flush_file_queue()
+            with _file_lock:
+                previous_handler = _file_handlers.get(name)
+                _file_handlers[name] = self._memory_handler
+                queue_handler = _get_file_queue_handler()
+            if previous_handler is not None:
+                previous_handler.close()
+            self.logger.addHandler(queue_handler)
+    
+    def __enter__(self) -> "Logger":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+    
+    def flush(self):
+        """コンソールへの出力と、キューに残っているログ・メモリ上にまとめているログのファイルへの書き出しを行う"""
+        self._console_handler.flush()
+        if self._memory_handler is not None:
+            _flush_file_queue()
+            self._memory_handler.flush()
     
     def debug(self, message: str):
         """デバッグレベルのログを出力"""
@@ -78,29 +237,40 @@ class Logger:
     
     def success(self, message: str):
         """成功メッセージを出力（カスタムレベル）"""
-        # 成功メッセージは情報レベルで出力
+        # 成功メッセージは情報レベルで出力（出力されない場合は文字列を組み立てない）
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         self.logger.info(f"✅ {message}")
     
     def progress(self, message: str):
         """進捗メッセージを出力（カスタムレベル）"""
-        # 進捗メッセージは情報レベルで出力
+        # 進捗メッセージは情報レベルで出力（出力されない場合は文字列を組み立てない）
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         self.logger.info(f"🔄 {message}")
     
     def section(self, title: str):
         """セクションタイトルを出力"""
-        self.logger.info(f"\n{'='*50}")
-        self.logger.info(f"📋 {title}")
-        self.logger.info(f"{'='*50}")
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        log = self.logger.info
+        log('\n' + self._SECTION_BAR)
+        log(f"📋 {title}")
+        log(self._SECTION_BAR)
     
     def subsection(self, title: str):
         """サブセクションタイトルを出力"""
-        self.logger.info(f"\n{'-'*30}")
-        self.logger.info(f"📌 {title}")
-        self.logger.info(f"{'-'*30}")
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        log = self.logger.info
+        log('\n' + self._SUBSECTION_BAR)
+        log(f"📌 {title}")
+        log(self._SUBSECTION_BAR)
 
 
 # グローバルロガーインスタンス
 _default_logger = None
+_default_logger_lock = threading.Lock()
 
 
 def get_logger(name: str = "QPP", level: int = logging.INFO, 
@@ -120,7 +290,9 @@ def get_logger(name: str = "QPP", level: int = logging.INFO,
     global _default_logger
     
     if _default_logger is None:
-        _default_logger = Logger(name, level, log_to_file, log_file)
+        with _default_logger_lock:
+            if _default_logger is None:
+                _default_logger = Logger(name, level, log_to_file, log_file)
     
     return _default_logger
 
@@ -1,9 +1,41 @@
 #!/usr/bin/env python3
 import json
 import csv
+import io
+import os
+import re
+import queue
+import threading
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import BinaryIO, Iterable, Iterator, List, Dict, Optional, Any, TextIO, Tuple
+
+import orjson
+
+try:
+    from .logger import get_logger
+except ImportError:
+    # スクリプトとして直接実行された場合
+    from logger import get_logger
+
+# ファイル入出力のバッファサイズ（チャンク境界を探す際に一度に読み込むバイト数にも使用）
+_BUFFER_SIZE = 1 << 20
+# JSONL出力時にまとめて書き込む行数
+_WRITE_BATCH_SIZE = 1024
+# JSONL出力時に書き込み待ちとして保持するバッチ数
+_WRITE_QUEUE_SIZE = 4
+# チャンク変換の進捗をログに出力する最大回数
+_MAX_PROGRESS_LOGS = 100
+# 総チャンク数が分からない逐次変換で進捗をログに出力する最短の間隔（秒）
+_PROGRESS_LOG_SECONDS = 5.0
+# プレビューで読み込み・表示する行数
+_PREVIEW_ROWS = 5
+# 行末の判定（newline=''で開いたテキストファイルと同じく\n・\r・\r\nのいずれも1つの行末とする）
+_LINE_END_PATTERN = re.compile(rb'\r\n|\r|\n')
 
 
 class TsvConverter:
@@ -21,11 +53,65 @@ class TsvConverter:
         self.chunk_size = chunk_size
         self.data = []
         self.headers = []
+        # load_tsvで行数の上限に達し、ファイルの途中までしか読み込んでいないかどうか
+        self._truncated = False
+        self.logger = get_logger("TsvConverter")
+    
+    def _open_read(self, tsv_file_path: str) -> TextIO:
+        """入力TSVファイルを大きめのバッファで読み込み用に開く"""
+        return open(tsv_file_path, 'r', encoding=self.encoding, buffering=_BUFFER_SIZE, newline='')
+    
+    def _parse_chunk_line(self, line: str) -> Optional[Dict[str, str]]:
+        """
+        チャンク処理用にTSVの1行を解析
+        
+        各フィールドの前後に空白がないことを前提とし、取り除くのは行末の改行のみ
+        
+        Args:
+            line (str): TSVの1行
+            
+        Returns:
+            Optional[Dict[str, str]]: id, contents, titleを持つ辞書（空行や3列に満たない行はNone）
+        """
+        # タブで分割（4列目以降は使用しないため分割しない）
+        parts = line.rstrip('\r\n').split('\t', 3)
+        if len(parts) < 3:
+            return None
+        
+        return {'id': parts[0], 'contents': parts[1], 'title': parts[2]}
+    
+    def _parse_spaces_row(self, line: str) -> Optional[Dict[str, str]]:
+        """
+        スペース区切り（4つのスペース）のTSVの1行を解析
+        
+        _parse_chunk_lineと同様に、各フィールドの前後に空白がないことを前提とし、
+        取り除くのは行末の改行のみ
+        
+        Args:
+            line (str): TSVの1行
+            
+        Returns:
+            Optional[Dict[str, str]]: id, title, contentsを持つ辞書（空白のみの行や3列に満たない行はNone）
+        """
+        # 空白のみの行は区切りのスペースを含んでいても読み飛ばす
+        if not line.strip():
+            return None
+        
+        # 行を分割（最初の2つのスペースで分割）
+        parts = line.rstrip('\r\n').split('    ', 2)  # 4つのスペースで分割
+        if len(parts) < 3:
+            return None
+        
+        # textカラムはcontentsとして最後に追加
+        return {'id': parts[0], 'title': parts[2], 'contents': parts[1]}
     
     def load_tsv_chunked(self, tsv_file_path: str, chunk_index: int = 0) -> bool:
         """
         TSVファイルをチャンク単位で読み込む
         
+        指定したチャンクのみを読み込む場合に使用する（全チャンクの変換にはconvert2json_chunkedを使用）
+        チャンクの開始位置は索引ファイルに保存し、2回目以降はその位置へ直接移動して読み込む
+        
         Args:
             tsv_file_path (str): TSVファイルのパス
             chunk_index (int): チャンクのインデックス（0から開始）
@@ -34,45 +120,24 @@ class TsvConverter:
             bool: 読み込み成功時True、失敗時False
         """
         try:
-            with open(tsv_file_path, 'r', encoding=self.encoding) as tsv_file:
-                # ヘッダー行を読み込み
-                header_line = tsv_file.readline().strip()
-                self.headers = [h.strip() for h in header_line.split('\t')]
-                
-                # チャンクの開始位置までスキップ
-                start_line = chunk_index * self.chunk_size
-                for _ in range(start_line):
-                    tsv_file.readline()
-                
-                # チャンクサイズ分のデータを読み込み
+            with open(tsv_file_path, 'rb') as tsv_file:
+                self._read_header(tsv_file)
+            
+            offsets = self._build_offset_index(tsv_file_path)
+            if 0 <= chunk_index < len(offsets) - 1:
+                self._load_range(tsv_file_path, offsets[chunk_index], offsets[chunk_index + 1])
+            else:
                 self.data = []
-                for _ in range(self.chunk_size):
-                    line = tsv_file.readline()
-                    if not line:
-                        break
-                    
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # タブで分割
-                    parts = line.split('\t')
-                    if len(parts) >= 3:
-                        row = {
-                            'id': parts[0].strip(),
-                            'contents': parts[1].strip(),
-                            'title': parts[2].strip()
-                        }
-                        self.data.append(row)
+            self._truncated = False
             
-            print(f"チャンク {chunk_index} 読み込み完了: {len(self.data)}件のデータ")
+            self.logger.info(f"チャンク {chunk_index} 読み込み完了: {len(self.data)}件のデータ")
             return True
             
         except FileNotFoundError:
-            print(f"エラー: ファイル '{tsv_file_path}' が見つかりません")
+            self.logger.error(f"ファイル '{tsv_file_path}' が見つかりません")
             return False
         except Exception as e:
-            print(f"エラー: {e}")
+            self.logger.error(f"TSVファイルの読み込みに失敗しました: {e}")
             return False
     
     def get_total_chunks(self, tsv_file_path: str) -> int:
@@ -86,85 +151,141 @@ class TsvConverter:
             int: 総チャンク数
         """
         try:
-            with open(tsv_file_path, 'r', encoding=self.encoding) as tsv_file:
+            with open(tsv_file_path, 'rb') as tsv_file:
                 # ヘッダー行をスキップ
-                tsv_file.readline()
+                self._read_header(tsv_file)
                 
-                # 総行数をカウント
-                total_lines = sum(1 for _ in tsv_file)
+                # 総行数をブロック単位での行末の数からカウント（末尾の行末のない行も1行と数える）
+                total_lines = 0
+                last_byte = b'\n'
+                while True:
+                    block = self._read_block(tsv_file)
+                    if not block:
+                        break
+                    total_lines += self._count_line_ends(block)
+                    last_byte = block[-1:]
+                if last_byte not in (b'\n', b'\r'):
+                    total_lines += 1
                 total_chunks = (total_lines + self.chunk_size - 1) // self.chunk_size
                 
                 return total_chunks
                 
         except Exception as e:
-            print(f"エラー: {e}")
+            self.logger.error(f"総チャンク数の取得に失敗しました: {e}")
             return 0
     
-    def load_tsv(self, tsv_file_path: str) -> bool:
+    def _iter_rows(self, tsv_file: TextIO) -> Iterator[Dict[str, Any]]:
+        """
+        TSVファイルからデータを1行ずつ読み込む（ヘッダー情報はself.headersに設定）
+        
+        Args:
+            tsv_file (TextIO): 読み込み用に開いたTSVファイル
+            
+        Yields:
+            Dict[str, Any]: 1行分のデータ（textカラムはcontentsに変更）
+        """
+        # ヘッダー行を一度だけ読み込み、区切り文字を判定
+        header_line = tsv_file.readline()
+        if not header_line:
+            raise ValueError("ヘッダー行がありません")
+        fieldnames = next(csv.reader([header_line], delimiter='\t'))
+        
+        # ヘッダーを確認
+        if len(fieldnames) == 1 and ' ' in fieldnames[0]:
+            # スペース区切りの場合、1行ずつ手動で処理
+            self.headers = [h.strip() for h in header_line.strip().split()]
+            
+            # データ行を処理
+            for line in tsv_file:
+                row = self._parse_spaces_row(line)
+                if row is not None:
+                    yield row
+        else:
+            # 通常のタブ区切りファイル
+            self.headers = fieldnames
+            
+            tsv_reader = csv.reader(tsv_file, delimiter='\t')
+            
+            # 出力するキーの並びと対応する列番号をヘッダーから一度だけ決める（textカラムはcontentsに変更）
+            layout = dict(zip(fieldnames, range(len(fieldnames))))
+            if 'text' in layout:
+                layout['contents'] = layout.pop('text')
+            keys = list(layout)
+            indices = list(layout.values())
+            if len(indices) > 1:
+                get_values = itemgetter(*indices)
+            else:
+                get_values = lambda row: tuple(row[i] for i in indices)
+            
+            column_count = len(fieldnames)
+            for row in tsv_reader:
+                if not row:
+                    continue
+                if len(row) == column_count:
+                    yield dict(zip(keys, get_values(row)))
+                else:
+                    # 列数がヘッダーと異なる行はcsv.DictReaderと同じ規則で辞書にする
+                    yield self._make_irregular_row(fieldnames, row)
+    
+    def _make_irregular_row(self, fieldnames: List[str], row: List[str]) -> Dict[Any, Any]:
+        """
+        列数がヘッダーと異なる行をcsv.DictReaderと同じ規則で辞書にする
+        
+        不足する列はNone、余分な列はキーNoneのリストとする
+        
+        Args:
+            fieldnames (List[str]): ヘッダーのリスト
+            row (List[str]): 1行分の列のリスト
+            
+        Returns:
+            Dict[Any, Any]: 1行分のデータ（textカラムはcontentsに変更）
+        """
+        row_dict = dict(zip(fieldnames, row))
+        if len(row) > len(fieldnames):
+            row_dict[None] = row[len(fieldnames):]
+        else:
+            for key in fieldnames[len(row):]:
+                row_dict[key] = None
+        
+        # textカラムをcontentsに変更
+        if 'text' in row_dict:
+            row_dict['contents'] = row_dict.pop('text')
+        return row_dict
+    
+    def load_tsv(self, tsv_file_path: str, max_rows: Optional[int] = None) -> bool:
         """
         TSVファイルを読み込む
         
         Args:
             tsv_file_path (str): TSVファイルのパス
+            max_rows (Optional[int]): 読み込む最大行数（Noneの場合はすべて。上限に達した時点で読み込みを終える）
             
         Returns:
             bool: 読み込み成功時True、失敗時False
         """
         try:
-            with open(tsv_file_path, 'r', encoding=self.encoding) as tsv_file:
-                # まず通常のCSVリーダーで試行
-                tsv_reader = csv.DictReader(tsv_file, delimiter='\t')
-                
-                # ヘッダーを確認
-                if len(tsv_reader.fieldnames) == 1 and ' ' in tsv_reader.fieldnames[0]:
-                    # スペース区切りの場合、ファイルをリセットして手動で処理
-                    tsv_file.seek(0)
-                    lines = tsv_file.readlines()
-                    
-                    # ヘッダー行を分割
-                    header_line = lines[0].strip()
-                    self.headers = [h.strip() for h in header_line.split()]
-                    
-                    # データ行を処理
-                    self.data = []
-                    for line in lines[1:]:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        
-                        # 行を分割（最初の2つのスペースで分割）
-                        parts = line.split('    ', 2)  # 4つのスペースで分割
-                        if len(parts) >= 3:
-                            row = {
-                                'id': parts[0].strip(),
-                                'text': parts[1].strip(),
-                                'title': parts[2].strip()
-                            }
-                            # textカラムをcontentsに変更
-                            row['contents'] = row.pop('text')
-                            self.data.append(row)
+            with self._open_read(tsv_file_path) as tsv_file:
+                if max_rows is None:
+                    self.data = list(self._iter_rows(tsv_file))
+                    self._truncated = False
                 else:
-                    # 通常のタブ区切りファイル
-                    self.headers = tsv_reader.fieldnames
-                    
-                    # データを読み込み
-                    self.data = []
-                    for row in tsv_reader:
-                        # textカラムをcontentsに変更
-                        if 'text' in row:
-                            row['contents'] = row.pop('text')
-                        
-                        self.data.append(row)
+                    # 続きの行があるかを判定するため1行だけ余分に読み込む
+                    self.data = list(islice(self._iter_rows(tsv_file), max_rows + 1))
+                    self._truncated = len(self.data) > max_rows
+                    del self.data[max_rows:]
             
-            print(f"TSVファイル読み込み完了: {len(self.data)}件のデータ")
-            print(f"ヘッダー: {self.headers}")
+            if self._truncated:
+                self.logger.info(f"TSVファイル読み込み完了: 先頭{len(self.data)}件のデータ")
+            else:
+                self.logger.info(f"TSVファイル読み込み完了: {len(self.data)}件のデータ")
+            self.logger.info(f"ヘッダー: {self.headers}")
             return True
             
         except FileNotFoundError:
-            print(f"エラー: ファイル '{tsv_file_path}' が見つかりません")
+            self.logger.error(f"ファイル '{tsv_file_path}' が見つかりません")
             return False
         except Exception as e:
-            print(f"エラー: {e}")
+            self.logger.error(f"TSVファイルの読み込みに失敗しました: {e}")
             return False
     
     def get_data(self) -> List[Dict[str, Any]]:
@@ -195,50 +316,167 @@ class TsvConverter:
         return len(self.data)
     
     def save_json(self, json_file_path: str, pretty_print: bool = True, 
-                  output_format: str = 'lines') -> bool:
+                  output_format: str = 'lines', durable: bool = False) -> bool:
         """
         JSONファイルに保存
         
         Args:
             json_file_path (str): 出力JSONファイルのパス
-            pretty_print (bool): 整形して出力するかどうか
+            pretty_print (bool): 整形して出力するかどうか（配列形式のみ。lines形式は常に1行1つで出力）
             output_format (str): 出力形式 ('lines' または 'array')
                 - 'lines': 1行1つのJSONオブジェクト（JSONL形式）
                 - 'array': 配列形式（従来の形式）
+            durable (bool): 保存後にディスクへの書き込み完了まで待つかどうか（Falseの場合はOSに任せる）
             
         Returns:
             bool: 保存成功時True、失敗時False
         """
         try:
-            with open(json_file_path, 'w', encoding='utf-8') as json_file:
-                if output_format == 'lines':
-                    # 1行1つのJSONオブジェクト形式（JSONL）
-                    for row in self.data:
-                        # 並び順を指定: id, contents, title
-                        ordered_row = {
-                            'id': row.get('id', ''),
-                            'contents': row.get('contents', ''),
-                            'title': row.get('title', '')
-                        }
-                        
-                        if pretty_print:
-                            json.dump(ordered_row, json_file, ensure_ascii=False, indent=2)
-                        else:
-                            json.dump(ordered_row, json_file, ensure_ascii=False)
-                        json_file.write('\n')
-                else:
-                    # 配列形式（従来の形式）
-                    if pretty_print:
-                        json.dump(self.data, json_file, ensure_ascii=False, indent=2)
-                    else:
-                        json.dump(self.data, json_file, ensure_ascii=False)
-            
-            print(f"JSONファイル保存完了: {json_file_path} (形式: {output_format})")
+            self._write_json(json_file_path, pretty_print, output_format, durable)
+            self.logger.info(f"JSONファイル保存完了: {json_file_path} (形式: {output_format})")
             return True
             
         except Exception as e:
-            print(f"エラー: {e}")
+            self.logger.error(f"JSONファイルの保存に失敗しました: {e}")
+            return False
+    
+    def _write_json(self, json_file_path: str, pretty_print: bool, output_format: str,
+                    durable: bool = False) -> None:
+        """
+        読み込み済みのデータをJSONファイルに書き出す（失敗時は例外を送出）
+        
+        Args:
+            json_file_path (str): 出力JSONファイルのパス
+            pretty_print (bool): 整形して出力するかどうか（配列形式のみ）
+            output_format (str): 出力形式 ('lines' または 'array')
+            durable (bool): 保存後にディスクへの書き込み完了まで待つかどうか
+        """
+        if output_format == 'lines':
+            # 1行1つのJSONオブジェクト形式（JSONL）
+            self._write_lines(json_file_path, self.data, durable)
+            return
+        
+        # 配列形式（従来の形式）
+        if pretty_print:
+            # 整形する場合のみ標準のjsonでテキストとして書き込む
+            with open(json_file_path, 'w', encoding='utf-8', buffering=_BUFFER_SIZE) as json_file:
+                json.dump(self.data, json_file, ensure_ascii=False, indent=2)
+                if durable:
+                    json_file.flush()
+                    os.fsync(json_file.fileno())
+        else:
+            # 整形しない場合はorjsonのバイト列をそのまま書き込む（列数が不正な行のキーNoneも許可）
+            with open(json_file_path, 'wb', buffering=_BUFFER_SIZE) as json_file:
+                json_file.write(orjson.dumps(self.data, option=orjson.OPT_NON_STR_KEYS))
+                if durable:
+                    json_file.flush()
+                    os.fsync(json_file.fileno())
+    
+    def _write_lines(self, json_file_path: str, rows: Iterable[Dict[str, Any]], durable: bool = False) -> int:
+        """
+        データを1行1つのJSONオブジェクト形式（JSONL）で書き出す（1件を複数行にすると
+        JSONLとして読めなくなるため整形はしない）
+        
+        呼び出し元のスレッドでエンコードしたバッチを書き込み用のスレッドへ渡し、os.writeの間に
+        次のバッチのエンコードを進める
+        
+        Args:
+            json_file_path (str): 出力ファイルのパス
+            rows (Iterable[Dict[str, Any]]): 書き出すデータ
+            durable (bool): 書き込み後にディスクへの書き込み完了まで待つかどうか
+            
+        Returns:
+            int: 書き出した件数
+        """
+        fd = os.open(json_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        batches = queue.Queue(maxsize=_WRITE_QUEUE_SIZE)
+        write_errors = []
+        
+        def write_batches():
+            finished = False
+            try:
+                while not finished:
+                    # 書き込み待ちのバッチをすべて取り出し、1回のシステムコールでまとめて書き込む
+                    pending = [batches.get()]
+                    while len(pending) <= _WRITE_QUEUE_SIZE:
+                        try:
+                            pending.append(batches.get_nowait())
+                        except queue.Empty:
+                            break
+                    if None in pending:
+                        finished = True
+                        pending = pending[:pending.index(None)]
+                    _write_all(fd, pending)
+            except Exception as e:
+                write_errors.append(e)
+                # エンコード側がキューへの追加で止まらないよう終了の合図まで読み捨てる
+                while not finished:
+                    finished = batches.get() is None
+        
+        writer = threading.Thread(target=write_batches, daemon=True)
+        writer.start()
+        row_count = 0
+        try:
+            batch = []
+            for row in rows:
+                # 並び順を指定: id, contents, title
+                ordered_row = {
+                    'id': row.get('id', ''),
+                    'contents': row.get('contents', ''),
+                    'title': row.get('title', '')
+                }
+                
+                # 改行付きでエンコードし、_WRITE_BATCH_SIZE行ごとにまとめて書き込みへ回す
+                batch.append(orjson.dumps(ordered_row, option=orjson.OPT_APPEND_NEWLINE))
+                row_count += 1
+                if len(batch) >= _WRITE_BATCH_SIZE:
+                    if write_errors:
+                        break
+                    batches.put(b''.join(batch))
+                    batch = []
+            
+            if batch and not write_errors:
+                batches.put(b''.join(batch))
+        finally:
+            batches.put(None)
+            writer.join()
+            try:
+                if durable and not write_errors:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        
+        if write_errors:
+            raise write_errors[0]
+        return row_count
+    
+    def _stream_json_lines(self, tsv_file_path: str, json_file_path: Path) -> bool:
+        """
+        TSVファイルを1行ずつ読み込みながらJSONL形式で書き出す（データをメモリ上に保持しない）
+        
+        Args:
+            tsv_file_path (str): 入力TSVファイルのパス
+            json_file_path (Path): 出力JSONファイルのパス
+            
+        Returns:
+            bool: 変換成功時True、失敗時False
+        """
+        try:
+            with self._open_read(tsv_file_path) as tsv_file:
+                row_count = self._write_lines(json_file_path, self._iter_rows(tsv_file))
+        except FileNotFoundError:
+            self.logger.error(f"ファイル '{tsv_file_path}' が見つかりません")
+            return False
+        except Exception as e:
+            self.logger.error(f"TSVファイルの変換に失敗しました: {e}")
+            # 書きかけの出力ファイルを残さない
+            json_file_path.unlink(missing_ok=True)
             return False
+        
+        self.logger.info(f"TSVファイル変換完了: {row_count}件のデータ")
+        self.logger.info(f"ヘッダー: {self.headers}")
+        self.logger.info(f"JSONファイル保存完了: {json_file_path} (形式: lines)")
+        return True
     
     def convert2json(self, tsv_file_path: str, json_file_path: Optional[str] = None, 
                 pretty_print: bool = True, output_format: str = 'lines') -> Optional[str]:
@@ -248,14 +486,14 @@ class TsvConverter:
         Args:
             tsv_file_path (str): 入力TSVファイルのパス
             json_file_path (str): 出力JSONファイルのパス（Noneの場合は自動生成）
-            pretty_print (bool): 整形して出力するかどうか
+            pretty_print (bool): 整形して出力するかどうか（配列形式のみ。lines形式は常に1行1つで出力）
             output_format (str): 出力形式 ('lines' または 'array')
             
         Returns:
             str: 出力JSONファイルのパス（失敗時はNone）
         """
-        # TSVファイルを読み込み
-        if not self.load_tsv(tsv_file_path):
+        # 配列形式は全データを読み込んでから保存（JSONL形式は1行ずつ変換）
+        if output_format != 'lines' and not self.load_tsv(tsv_file_path):
             return None
         
         # 出力ファイル名が指定されていない場合は自動生成
@@ -272,19 +510,24 @@ class TsvConverter:
         
         # 既存ファイルの確認
         if json_file_path.exists():
-            print(f"警告: ファイル '{json_file_path}' は既に存在します。")
+            self.logger.warning(f"ファイル '{json_file_path}' は既に存在します。")
             return None
         
         # 出力ディレクトリが存在しない場合は作成
         json_file_path.parent.mkdir(parents=True, exist_ok=True)
         
         # JSONファイルに保存
-        if self.save_json(str(json_file_path), pretty_print, output_format):
+        if output_format == 'lines':
+            saved = self._stream_json_lines(tsv_file_path, json_file_path)
+        else:
+            saved = self.save_json(str(json_file_path), pretty_print, output_format)
+        
+        if saved:
             return str(json_file_path)
         else:
             return None
     
-    def preview_data(self, max_rows: int = 5) -> None:
+    def preview_data(self, max_rows: int = _PREVIEW_ROWS) -> None:
         """
         データのプレビューを表示
         
@@ -292,67 +535,382 @@ class TsvConverter:
             max_rows (int): 表示する最大行数
         """
         if not self.data:
-            print("データが読み込まれていません")
+            self.logger.warning("データが読み込まれていません")
             return
         
-        print(f"\n=== データプレビュー（最大{max_rows}行）===")
-        print(f"ヘッダー: {self.headers}")
-        print(f"総行数: {len(self.data)}")
-        print("\nデータ:")
+        self.logger.section(f"データプレビュー（最大{max_rows}行）")
+        self.logger.info(f"ヘッダー: {self.headers}")
+        if self._truncated:
+            self.logger.info(f"総行数: {len(self.data)}行以上（先頭のみ読み込み）")
+        else:
+            self.logger.info(f"総行数: {len(self.data)}")
         
         for i, row in enumerate(self.data[:max_rows]):
-            print(f"行 {i+1}: {row}")
+            self.logger.info(f"行 {i+1}: {row}")
         
         if len(self.data) > max_rows:
-            print(f"... 他 {len(self.data) - max_rows} 行")
+            self.logger.info(f"... 他 {len(self.data) - max_rows} 行{'以上' if self._truncated else ''}")
+        elif self._truncated:
+            self.logger.info("... 以降の行は読み込んでいません")
 
     def convert2json_chunked(self, tsv_file_path: str, output_dir: str, 
-                           pretty_print: bool = True, output_format: str = 'lines') -> bool:
+                           pretty_print: bool = False, output_format: str = 'lines',
+                           max_workers: Optional[int] = None) -> bool:
         """
         TSVファイルをチャンク単位でJSON形式に変換
         
+        チャンク境界のバイト位置を求めた後、各チャンクを複数プロセスで並列に変換する
+        
         Args:
             tsv_file_path (str): 入力TSVファイルのパス
             output_dir (str): 出力ディレクトリのパス
-            pretty_print (bool): 整形して出力するかどうか
+            pretty_print (bool): 整形して出力するかどうか（配列形式のみ。lines形式は常に1行1つで出力）
             output_format (str): 出力形式 ('lines' または 'array')
+            max_workers (int): 変換に使用するプロセス数（Noneの場合はCPU数、1の場合は単一プロセスで逐次変換）
             
         Returns:
             bool: 変換成功時True、失敗時False
         """
-        # 総チャンク数を取得
-        total_chunks = self.get_total_chunks(tsv_file_path)
-        if total_chunks == 0:
-            return False
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers <= 1:
+            return self.convert2json_streaming(tsv_file_path, output_dir, pretty_print, output_format)
         
-        print(f"総チャンク数: {total_chunks}")
+        chunk_path_template = self._prepare_chunk_output(tsv_file_path, output_dir)
         
-        # 出力ディレクトリを作成
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
+        try:
+            offsets = self._find_chunk_offsets(tsv_file_path)
+            total_chunks = len(offsets) - 1
+            if total_chunks == 0:
+                return False
+            
+            # チャンクの番号順にバイト範囲を割り当てる（ログは結果を受け取ったこのプロセスで出力）
+            log_interval = max(1, total_chunks // _MAX_PROGRESS_LOGS)
+            with ProcessPoolExecutor(max_workers=min(max_workers, total_chunks)) as executor:
+                results = executor.map(_convert_range, repeat(tsv_file_path), offsets[:-1], offsets[1:],
+                                       repeat(chunk_path_template), range(total_chunks),
+                                       repeat(self.encoding), repeat(pretty_print), repeat(output_format))
+                for chunk_index, result in enumerate(results):
+                    self._log_chunk(chunk_index, result, chunk_index % log_interval == 0)
+                    
+        except FileNotFoundError:
+            self.logger.error(f"ファイル '{tsv_file_path}' が見つかりません")
+            return False
+        except Exception as e:
+            self.logger.error(f"チャンク変換に失敗しました: {e}")
+            return False
         
-        # 各チャンクを処理
-        for chunk_index in range(total_chunks):
-            print(f"\nチャンク {chunk_index + 1}/{total_chunks} を処理中...")
+        self.logger.success(f"全チャンクの処理が完了しました（総チャンク数: {total_chunks}）。出力先: {output_dir}")
+        return True
+    
+    def _find_chunk_offsets(self, tsv_file_path: str) -> List[int]:
+        """
+        ヘッダー行の直後からchunk_size行ごとの行頭のバイト位置を求める（ヘッダー情報はself.headersに設定）
+        
+        Args:
+            tsv_file_path (str): TSVファイルのパス
             
-            # チャンクを読み込み
-            if not self.load_tsv_chunked(tsv_file_path, chunk_index):
-                print(f"チャンク {chunk_index} の読み込みに失敗しました")
-                continue
+        Returns:
+            List[int]: 各チャンクの開始位置と、最後のチャンクの終了位置（ファイル末尾）のリスト
+        """
+        with open(tsv_file_path, 'rb') as tsv_file:
+            self._read_header(tsv_file)
             
-            # 出力ファイル名を生成
-            tsv_path = Path(tsv_file_path)
-            json_file_path = output_path / f"{tsv_path.stem}_chunk_{chunk_index:04d}.jsonl"
+            position = tsv_file.tell()
+            offsets = [position]
+            remaining = self.chunk_size
+            while True:
+                block = self._read_block(tsv_file)
+                if not block:
+                    break
+                
+                # ブロック内の行末の数がチャンク境界に届く場合のみ境界の位置を探す
+                line_end_count = self._count_line_ends(block)
+                if line_end_count >= remaining:
+                    line_ends = _LINE_END_PATTERN.finditer(block)
+                    while line_end_count >= remaining:
+                        for _ in range(remaining):
+                            line_end = next(line_ends)
+                        offsets.append(position + line_end.end())
+                        line_end_count -= remaining
+                        remaining = self.chunk_size
+                remaining -= line_end_count
+                position += len(block)
             
-            # JSONファイルに保存
-            if not self.save_json(str(json_file_path), pretty_print, output_format):
-                print(f"チャンク {chunk_index} の保存に失敗しました")
-                continue
+            # 最後の端数のチャンク
+            if position != offsets[-1]:
+                offsets.append(position)
+        
+        return offsets
+    
+    def _build_offset_index(self, tsv_file_path: str) -> List[int]:
+        """
+        チャンクの開始位置の索引を取得
+        
+        索引は「{TSVファイルのパス}.offsets」にJSONとして保存し、TSVファイルの更新日時・サイズと
+        チャンクサイズが一致する間は再利用する
+        
+        Args:
+            tsv_file_path (str): TSVファイルのパス
             
-            print(f"チャンク {chunk_index} 完了: {json_file_path}")
+        Returns:
+            List[int]: 各チャンクの開始位置と、最後のチャンクの終了位置（ファイル末尾）のリスト
+        """
+        index_path = f"{tsv_file_path}.offsets"
+        stat = os.stat(tsv_file_path)
+        index_key = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'chunk_size': self.chunk_size}
         
-        print(f"\n全チャンクの処理が完了しました。出力先: {output_dir}")
+        try:
+            with open(index_path, 'rb') as index_file:
+                index = orjson.loads(index_file.read())
+            offsets = index['offsets']
+            if ({key: index[key] for key in index_key} == index_key
+                    and isinstance(offsets, list) and offsets
+                    and all(type(offset) is int and 0 <= offset <= stat.st_size for offset in offsets)):
+                return offsets
+        except Exception:
+            # 索引ファイルがない、または壊れている場合は作り直す
+            pass
+        
+        offsets = self._find_chunk_offsets(tsv_file_path)
+        try:
+            with open(index_path, 'wb') as index_file:
+                index_file.write(orjson.dumps({**index_key, 'offsets': offsets}))
+        except OSError as e:
+            self.logger.warning(f"索引ファイル '{index_path}' を保存できませんでした: {e}")
+        return offsets
+    
+    def _read_header(self, tsv_file: BinaryIO) -> None:
+        """
+        バイナリモードで開いたTSVファイルの先頭からヘッダー行を読み込み、self.headersに設定
+        
+        Args:
+            tsv_file (BinaryIO): 先頭位置にあるTSVファイル
+        """
+        header = b''
+        while True:
+            block = self._read_block(tsv_file)
+            line_end = _LINE_END_PATTERN.search(block)
+            if line_end is not None:
+                # 読み過ぎた分を戻し、ヘッダー行の直後を読み込み位置とする
+                header += block[:line_end.start()]
+                tsv_file.seek(line_end.end() - len(block), os.SEEK_CUR)
+                break
+            if not block:
+                break
+            header += block
+        
+        header_line = header.decode(self.encoding).strip()
+        self.headers = [h.strip() for h in header_line.split('\t')]
+    
+    def _read_block(self, tsv_file: BinaryIO) -> bytes:
+        """
+        バイナリモードで開いたTSVファイルから_BUFFER_SIZEバイト程度のブロックを読み込む
+        
+        ブロックの末尾が\rの場合は続く\nも含めて読み込み、\r\nがブロックをまたいで分かれないようにする
+        
+        Args:
+            tsv_file (BinaryIO): 読み込み用に開いたTSVファイル
+            
+        Returns:
+            bytes: 読み込んだブロック（ファイル末尾では空）
+        """
+        block = tsv_file.read(_BUFFER_SIZE)
+        while block.endswith(b'\r'):
+            next_byte = tsv_file.read(1)
+            if not next_byte:
+                break
+            block += next_byte
+        return block
+    
+    def _count_line_ends(self, block: bytes) -> int:
+        """ブロック内の行末（\n・\r・\r\n）の数を数える"""
+        return block.count(b'\n') + block.count(b'\r') - block.count(b'\r\n')
+    
+    def _load_range(self, tsv_file_path: str, start: int, end: int) -> None:
+        """
+        TSVファイルのバイト範囲[start, end)の行を読み込み、self.dataに設定
+        
+        Args:
+            tsv_file_path (str): TSVファイルのパス
+            start (int): 範囲の開始位置（行頭）
+            end (int): 範囲の終了位置（行頭またはファイル末尾）
+        """
+        with open(tsv_file_path, 'rb') as tsv_file:
+            tsv_file.seek(start)
+            text = tsv_file.read(end - start).decode(self.encoding)
+        # 逐次変換（newline=''で開いたファイルの行単位の読み込み）と同じ行末で分割する
+        lines = io.StringIO(text, newline='')
+        self.data = [row for row in map(self._parse_chunk_line, lines) if row is not None]
+    
+    def convert2json_streaming(self, tsv_file_path: str, output_dir: str, 
+                               pretty_print: bool = False, output_format: str = 'lines') -> bool:
+        """
+        TSVファイルを先頭から1回だけ読み進め、chunk_size行ごとにJSONファイルへ書き出す
+        
+        メモリ上に保持するのは1チャンク分のデータのみ
+        
+        Args:
+            tsv_file_path (str): 入力TSVファイルのパス
+            output_dir (str): 出力ディレクトリのパス
+            pretty_print (bool): 整形して出力するかどうか（配列形式のみ。lines形式は常に1行1つで出力）
+            output_format (str): 出力形式 ('lines' または 'array')
+            
+        Returns:
+            bool: 変換成功時True、失敗時False
+        """
+        chunk_path_template = self._prepare_chunk_output(tsv_file_path, output_dir)
+        # 総チャンク数を数えるためだけにファイルを読み直さないよう、進捗は一定時間ごとに出力する
+        last_log_time = None
+        
+        chunk_index = 0
+        try:
+            with self._open_read(tsv_file_path) as tsv_file:
+                # ヘッダー行を読み込み
+                header_line = tsv_file.readline().strip()
+                self.headers = [h.strip() for h in header_line.split('\t')]
+                
+                self.data = []
+                line_count = 0
+                for line_count, line in enumerate(tsv_file, 1):
+                    row = self._parse_chunk_line(line)
+                    if row is not None:
+                        self.data.append(row)
+                    
+                    # chunk_size行ごとにチャンクとして保存
+                    if line_count % self.chunk_size == 0:
+                        result = self._save_chunk(chunk_path_template, chunk_index, pretty_print, output_format)
+                        now = time.monotonic()
+                        log_progress = last_log_time is None or now - last_log_time >= _PROGRESS_LOG_SECONDS
+                        if log_progress:
+                            last_log_time = now
+                        self._log_chunk(chunk_index, result, log_progress)
+                        chunk_index += 1
+                
+                # 最後の端数のチャンクを保存
+                if line_count % self.chunk_size != 0:
+                    result = self._save_chunk(chunk_path_template, chunk_index, pretty_print, output_format)
+                    self._log_chunk(chunk_index, result, True)
+                    chunk_index += 1
+                
+        except FileNotFoundError:
+            self.logger.error(f"ファイル '{tsv_file_path}' が見つかりません")
+            return False
+        except Exception as e:
+            self.logger.error(f"チャンク変換に失敗しました: {e}")
+            return False
+        
+        if chunk_index == 0:
+            return False
+        
+        self.logger.success(f"全チャンクの処理が完了しました（総チャンク数: {chunk_index}）。出力先: {output_dir}")
         return True
+    
+    def _prepare_chunk_output(self, tsv_file_path: str, output_dir: str) -> str:
+        """
+        出力ディレクトリを作成し、チャンクの出力ファイル名のテンプレートを返す
+        
+        Args:
+            tsv_file_path (str): 入力TSVファイルのパス
+            output_dir (str): 出力ディレクトリのパス
+            
+        Returns:
+            str: チャンクのインデックスをformatで埋め込む出力ファイルパスのテンプレート
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        # パスに含まれる波括弧がformatの置換フィールドとして扱われないようエスケープする
+        prefix = os.path.join(output_dir, f"{Path(tsv_file_path).stem}_chunk_")
+        return prefix.replace('{', '{{').replace('}', '}}') + "{:04d}.jsonl"
+    
+    def _save_chunk(self, chunk_path_template: str, chunk_index: int, 
+                    pretty_print: bool, output_format: str) -> Tuple[int, str, Optional[str]]:
+        """
+        読み込み済みの1チャンク分のデータを保存してクリア（ログは出力せず結果を返す）
+        
+        Args:
+            chunk_path_template (str): チャンクの出力ファイルパスのテンプレート
+            chunk_index (int): チャンクのインデックス
+            pretty_print (bool): 整形して出力するかどうか
+            output_format (str): 出力形式 ('lines' または 'array')
+            
+        Returns:
+            Tuple[int, str, Optional[str]]: (データ件数, 出力ファイルのパス, 失敗時のエラーメッセージ)
+        """
+        # 出力ファイル名を生成
+        json_file_path = chunk_path_template.format(chunk_index)
+        row_count = len(self.data)
+        
+        # JSONファイルに保存
+        error = None
+        try:
+            self._write_json(json_file_path, pretty_print, output_format)
+        except Exception as e:
+            error = str(e)
+        self.data = []
+        return row_count, json_file_path, error
+    
+    def _log_chunk(self, chunk_index: int, result: Tuple[int, str, Optional[str]], log_progress: bool) -> None:
+        """
+        チャンクの保存結果をログに出力（失敗時は常に、成功時はlog_progressがTrueの場合のみ出力）
+        
+        Args:
+            chunk_index (int): チャンクのインデックス
+            result (Tuple[int, str, Optional[str]]): _save_chunkの結果
+            log_progress (bool): 成功時に進捗をログに出力するかどうか
+        """
+        row_count, json_file_path, error = result
+        if error is not None:
+            self.logger.error(f"チャンク {chunk_index} の保存に失敗しました: {error}")
+        elif log_progress:
+            self.logger.progress(f"チャンク {chunk_index} 完了: {row_count}件のデータ -> {json_file_path}")
+
+
+def _write_all(fd: int, buffers: List[bytes]) -> None:
+    """
+    複数のバッファを順にすべて書き込む（writevが使える環境では1回のシステムコールにまとめる）
+    
+    Args:
+        fd (int): 書き込み用に開いたファイルディスクリプタ
+        buffers (List[bytes]): 書き込むバッファのリスト（書き込み済みの分は取り除かれる）
+    """
+    if not hasattr(os, 'writev'):
+        for buffer in buffers:
+            view = memoryview(buffer)
+            while view:
+                view = view[os.write(fd, view):]
+        return
+    
+    while buffers:
+        written = os.writev(fd, buffers)
+        # 書き込み済みのバッファを取り除き、途中まで書き込まれたバッファは残りの部分にする
+        while buffers and written >= len(buffers[0]):
+            written -= len(buffers[0])
+            buffers.pop(0)
+        if written:
+            buffers[0] = memoryview(buffers[0])[written:]
+
+
+def _convert_range(tsv_file_path: str, start: int, end: int, chunk_path_template: str, chunk_index: int,
+                   encoding: str, pretty_print: bool, output_format: str) -> Tuple[int, str, Optional[str]]:
+    """
+    TSVファイルのバイト範囲[start, end)を1チャンクとしてJSONファイルへ変換する（プロセスプールのワーカー）
+    
+    Args:
+        tsv_file_path (str): 入力TSVファイルのパス
+        start (int): チャンクの開始位置（行頭）
+        end (int): チャンクの終了位置（次のチャンクの行頭またはファイル末尾）
+        chunk_path_template (str): チャンクの出力ファイルパスのテンプレート
+        chunk_index (int): チャンクのインデックス
+        encoding (str): ファイルエンコーディング
+        pretty_print (bool): 整形して出力するかどうか
+        output_format (str): 出力形式 ('lines' または 'array')
+        
+    Returns:
+        Tuple[int, str, Optional[str]]: (データ件数, 出力ファイルのパス, 失敗時のエラーメッセージ)
+    """
+    converter = TsvConverter(encoding)
+    converter._load_range(tsv_file_path, start, end)
+    return converter._save_chunk(chunk_path_template, chunk_index, pretty_print, output_format)
 
 
 def main():
@@ -362,43 +920,48 @@ def main():
     parser.add_argument('-o', '--output', help='出力JSONファイルのパス（省略時は自動生成）')
     parser.add_argument('-e', '--encoding', default='utf-8', help='ファイルエンコーディング（デフォルト: utf-8）')
     parser.add_argument('-p', '--preview', action='store_true', help='データのプレビューを表示')
-    parser.add_argument('--no-pretty', action='store_true', help='JSONを整形せずに出力')
+    parser.add_argument('--no-pretty', action='store_true', help='配列形式のJSONを整形せずに出力（lines形式は常に整形なし）')
     parser.add_argument('-f', '--format', choices=['lines', 'array'], default='lines',
                        help='出力形式: lines=1行1つのJSONオブジェクト, array=配列形式（デフォルト: lines）')
     parser.add_argument('--chunked', default=True, action='store_true', help='大きなファイルをチャンク単位で処理')
     parser.add_argument('--chunk-size', type=int, default=10000, help='チャンクサイズ（行数、デフォルト: 10000）')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                       help='チャンク変換に使用するプロセス数（デフォルト: CPU数）')
     
     args = parser.parse_args()
     
     # コンバーターを作成
     convert2jsoner = TsvConverter(args.encoding, args.chunk_size)
+    logger = convert2jsoner.logger
     
     # プレビューオプションが指定されている場合
     if args.preview:
-        if convert2jsoner.load_tsv(args.input_file):
+        # 表示する行だけを読み込み、ファイル全体は読み込まない
+        if convert2jsoner.load_tsv(args.input_file, max_rows=_PREVIEW_ROWS):
             convert2jsoner.preview_data()
         return
     
     # チャンキング処理が指定されている場合
     if args.chunked:
         if args.output is None:
-            print("エラー: チャンキング処理では出力ディレクトリを指定してください（-o オプション）")
+            logger.error("チャンキング処理では出力ディレクトリを指定してください（-o オプション）")
             return
         
-        success = convert2jsoner.convert2json_chunked(args.input_file, args.output, not args.no_pretty, args.format)
+        success = convert2jsoner.convert2json_chunked(args.input_file, args.output, not args.no_pretty, args.format,
+                                                       args.workers)
         if success:
-            print("チャンキング変換が正常に完了しました。")
+            logger.success("チャンキング変換が正常に完了しました。")
         else:
-            print("チャンキング変換に失敗しました。")
+            logger.error("チャンキング変換に失敗しました。")
         return
     
     # 通常の変換実行
     result = convert2jsoner.convert2json(args.input_file, args.output, not args.no_pretty, args.format)
     
     if result:
-        print("変換が正常に完了しました。")
+        logger.success("変換が正常に完了しました。")
     else:
-        print("変換に失敗しました。")
+        logger.error("変換に失敗しました。")
 
 
 if __name__ == "__main__":